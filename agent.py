@@ -631,7 +631,8 @@ class AgentSkillsFramework:
             console.print(f"[dim]Arguments string: {json_str[:200]}...[/dim]")
             return {"_raw": json_str, "_parse_error": str(e)}
     
-    def __init__(self, api_key: str = None, config_path: str = "config.yaml", event_callback=None):
+    def __init__(self, api_key: str = None, config_path: str = "config.yaml", event_callback=None,
+                 tool_call_listener=None):
         # Load configuration
         config = load_config(config_path)
         self.config = config  # Store config for later use
@@ -639,6 +640,10 @@ class AgentSkillsFramework:
         # Event callback for real-time updates (used by web UI)
         self.event_callback = event_callback
         
+        # Called with (function_name, function_args) for every tool call the
+        # agent dispatches (used by eval metrics)
+        self.tool_call_listener = tool_call_listener
+        
         # Clean scratch directory at the beginning of each run
         self._initialize_scratch_directory()
         
@@ -1227,6 +1232,13 @@ Activate available skills to complete tasks. After each skill, consider whether
                         function_name = tool_call.function.name
                         function_args = self._safe_parse_json(tool_call.function.arguments)
                         
+                        if self.tool_call_listener:
+                            try:
+                                self.tool_call_listener(function_name, function_args)
+                            except Exception:
+                                # Don't let listener errors break the agent
+                                pass
+                        
                         # Note: Parse errors are already handled above - we won't reach here with malformed JSON
                         
                         # Check if this is a skill activation request (new format: activate_SKILLNAME)
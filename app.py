@@ -3,12 +3,14 @@
 Web frontend for Agent Skills Framework using Flask and HTMX
 """
 import os
-import json
 import time
 import threading
 import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+import orjson
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 from agent import AgentSkillsFramework
 from dotenv import load_dotenv
 from keepalive import start_keepalive_thread
@@ -25,17 +27,34 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', default_secret)
 
 # Global agent instance and state
 agent = None
+# Run histories are bounded so long sessions can't grow them without limit
 agent_state = {
     'running': False,
-    'logs': [],
-    'chat_history': [],
+    'logs': deque(maxlen=10000),
+    'chat_history': deque(maxlen=5000),
     'skills_loaded': [],
-    'tools_called': [],
+    'tools_called': deque(maxlen=2000),
     'start_time': None,
     'elapsed_time': 0
 }
 state_lock = threading.Lock()
 
+# /api/status is polled by the frontend, so serve a briefly cached body
+# instead of taking state_lock on every request
+STATUS_CACHE_TTL = 0.1  # seconds
+_status_cache = {'body': None, 'ts': 0.0}
+_skills_loaded_json = b'[]'
+
+# Held for the duration of an agent run. Acquired without blocking, so
+# checking and claiming the shared agent is a single atomic step.
+run_mutex = threading.Lock()
+
+# Agent runs execute on pooled worker threads; the request thread only
+# streams frames off the run's event queue
+run_executor = ThreadPoolExecutor(thread_name_prefix='agent-run')
+# Queued after the last event of a run to end the stream
+STREAM_END = None
+
 # Session management - store state per session ID
 sessions = {}  # session_id -> session_state
 sessions_lock = threading.Lock()
@@ -70,30 +89,135 @@ def session_cleanup_thread():
 threading.Thread(target=session_cleanup_thread, daemon=True).start()
 
 
+# Streaming responses must reach the browser frame-by-frame. nginx honours
+# X-Accel-Buffering, and the leading comment pushes past the ~4KB threshold
+# some proxies and user agents buffer before delivering the first bytes.
+SSE_HEADERS = {
+    'X-Accel-Buffering': 'no',
+    'Cache-Control': 'no-cache'
+}
+SSE_PADDING = b':' + b' ' * 4096 + b'\n\n'
+
+
+def sse_frame(payload):
+    """Encode a payload as a single SSE data frame"""
+    return b"data: " + orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
+
+
+def json_response(payload):
+    """Build a JSON response serialized with orjson"""
+    return Response(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS), mimetype='application/json')
+
+
+def sse_response(frames):
+    """Build an unbuffered text/event-stream response from a frame generator"""
+    def stream():
+        yield SSE_PADDING
+        yield from frames
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
 def get_client_ip():
     """Get the real client IP address from X-Forwarded-For header or remote_addr"""
-    if request.headers.get('X-Forwarded-For'):
+    # Parsed once per request and cached on flask.g
+    client_ip = getattr(g, 'client_ip', None)
+    if client_ip is not None:
+        return client_ip
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    if forwarded_for:
         # X-Forwarded-For can contain multiple IPs, use the first one (original client)
-        return request.headers.get('X-Forwarded-For').split(',')[0].strip()
-    return request.remote_addr
+        client_ip = forwarded_for.split(',', 1)[0].strip()
+    else:
+        client_ip = request.remote_addr
+    g.client_ip = client_ip
+    return client_ip
 
 
 def init_agent():
     """Initialize the agent framework"""
-    global agent
+    global agent, _skills_loaded_json
     try:
         agent = AgentSkillsFramework()
+        # Skills are static after startup, so snapshot and serialize them
+        # once, outside the lock; /api/status reuses the bytes on every poll
+        skills_loaded = agent.skill_loader.get_skills_metadata()
+        skills_loaded_json = orjson.dumps(skills_loaded)
         with state_lock:
-            agent_state['skills_loaded'] = [
-                {'name': skill['name'], 'description': skill['description']}
-                for skill in agent.skill_loader.skills.values()
-            ]
+            agent_state['skills_loaded'] = skills_loaded
+            _skills_loaded_json = skills_loaded_json
         return True
     except Exception as e:
         print(f"Error initializing agent: {e}")
         return False
 
 
+class BatchedStateWriter:
+    """Apply streamed events to shared state in batches to amortize lock acquisition
+    
+    A flusher thread applies a partial batch once its oldest event is
+    max_delay old, so state never lags the stream by more than that while
+    the agent is blocked on an LLM or tool call. close() applies what is
+    left and stops the thread.
+    """
+    
+    def __init__(self, apply_batch, max_batch=8, max_delay=0.05):
+        self.apply_batch = apply_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay  # seconds an event may wait before it is applied
+        self._pending = []
+        self._first_pending_at = 0.0  # time.monotonic() when _pending became non-empty
+        self._closed = False
+        # Private condition: serializes batches so events are applied in
+        # order, and wakes the flusher when a batch starts
+        self._cond = threading.Condition()
+        self._flusher = threading.Thread(target=self._run_flusher, daemon=True)
+        self._flusher.start()
+    
+    def add(self, event):
+        """Queue an event, applying the batch at once if it is full"""
+        with self._cond:
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+                self._cond.notify()
+            self._pending.append(event)
+            if len(self._pending) >= self.max_batch:
+                self._flush_locked()
+    
+    def close(self):
+        """Apply any pending events and stop the flusher (call once when the run ends)"""
+        with self._cond:
+            self._closed = True
+            self._flush_locked()
+            self._cond.notify()
+        self._flusher.join()
+    
+    def _run_flusher(self):
+        with self._cond:
+            while not self._closed:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                remaining = self._first_pending_at + self.max_delay - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                else:
+                    self._flush_locked()
+    
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            self.apply_batch(batch)
+        except Exception as e:
+            # Part of the batch may already be applied, so it is not retried
+            # (that would duplicate events); report what was lost instead
+            print(
+                f"Error applying {len(batch)} event(s) to session state "
+                f"({', '.join(event.get('type', '?') for event in batch)}): {e}"
+            )
+
+
 class WebAgentWrapper:
     """Wrapper around AgentSkillsFramework to capture execution events"""
     
@@ -103,6 +227,9 @@ class WebAgentWrapper:
         self.start_time = None
         self.event_queue = event_queue  # Queue for real-time streaming
         self.persist_event = persist_event
+        # Formatted "YYYY-MM-DDTHH:MM:SS" for the most recent event second
+        self._ts_second = None
+        self._ts_prefix = ''
         
     def event_callback(self, event_type_or_entry, data=None):
         """Callback for real-time events from the agent"""
@@ -132,162 +259,184 @@ class WebAgentWrapper:
         if not event_type:
             return
         
-        if event_type == 'user_input':
-            content = log_entry.get('content') if isinstance(log_entry, dict) else ''
-            self.add_event('user_message', {'content': content}, elapsed)
-        elif event_type == 'skill_activated':
-            # Skill activation completed successfully
-            # Handle both old format (skill_name in log_entry) and new format (in data dict)
-            if 'data' in log_entry and isinstance(log_entry['data'], dict):
-                skill_name = log_entry['data'].get('skill_name', '')
-                tools_count = log_entry['data'].get('tools_count', 0)
-            else:
-                skill_name = log_entry.get('skill_name', '')
-                tools_count = log_entry.get('tools_count', 0)
-            self.add_event('skill_activated', {
-                'skill_name': skill_name,
-                'tools_count': tools_count
-            }, elapsed)
-        elif event_type == 'skill_deactivated':
-            # Skill deactivated
-            skill_name = log_entry.get('skill_name') if isinstance(log_entry, dict) else ''
-            self.add_event('skill_deactivated', {
-                'skill_name': skill_name
-            }, elapsed)
-        elif event_type == 'skill_activation_failed':
-            # Skill activation failed
-            skill_name = log_entry.get('skill_name') if isinstance(log_entry, dict) else ''
-            self.add_event('skill_activation_failed', {
-                'skill_name': skill_name
-            }, elapsed)
-        elif event_type == 'reasoning_trace':
-            # Just store it, don't process
-            if isinstance(log_entry, dict) and isinstance(log_entry.get('data'), dict):
-                trace = log_entry['data'].get('trace', '')
-                if trace:
-                    self.add_event('reasoning', {'content': trace}, elapsed)
-        elif event_type == 'llm_response':
-            tool_calls = log_entry.get('tool_calls', []) if isinstance(log_entry, dict) else []
-            
-            # Check for skill activations and tool calls
-            for tc in tool_calls:
-                if not isinstance(tc, dict):
-                    continue
-                func_name = tc.get('function')
-                if func_name and func_name.startswith('activate_'):
-                    skill_name = func_name.replace('activate_', '')
-                    self.add_event('skill_activation', {'skill_name': skill_name}, elapsed)
-                elif func_name:
-                    self.add_event('tool_call', {
-                        'tool_name': func_name,
-                        'arguments': tc.get('arguments', {})
-                    }, elapsed)
-            
-            # Include reasoning traces if present
-            content = log_entry.get('content', '') if isinstance(log_entry, dict) else ''
-            response_data = {
-                'content': content,
-                'tool_calls': tool_calls
-            }
-            if isinstance(log_entry, dict) and 'reasoning' in log_entry:
-                response_data['reasoning'] = log_entry['reasoning']
-            
-            self.add_event('llm_response', response_data, elapsed)
-        elif event_type == 'tool_execution':
-            # Tool execution result
-            result = log_entry.get('result', {}) if isinstance(log_entry, dict) else {}
-            
-            # Check for errors at multiple levels
-            is_error = False
-            if isinstance(result, dict):
-                if 'error' in result:
+        handler = self._HANDLERS.get(event_type)
+        if handler:
+            handler(self, log_entry, elapsed)
+
+    def _on_user_input(self, log_entry, elapsed):
+        self.add_event('user_message', {'content': log_entry.get('content')}, elapsed)
+
+    def _on_skill_activated(self, log_entry, elapsed):
+        # Skill activation completed successfully
+        # Handle both old format (skill_name in log_entry) and new format (in data dict)
+        source = log_entry['data'] if isinstance(log_entry.get('data'), dict) else log_entry
+        self.add_event('skill_activated', {
+            'skill_name': source.get('skill_name', ''),
+            'tools_count': source.get('tools_count', 0)
+        }, elapsed)
+
+    def _on_skill_deactivated(self, log_entry, elapsed):
+        self.add_event('skill_deactivated', {'skill_name': log_entry.get('skill_name')}, elapsed)
+
+    def _on_skill_activation_failed(self, log_entry, elapsed):
+        self.add_event('skill_activation_failed', {'skill_name': log_entry.get('skill_name')}, elapsed)
+
+    def _on_reasoning_trace(self, log_entry, elapsed):
+        data = log_entry.get('data')
+        trace = data.get('trace', '') if isinstance(data, dict) else ''
+        if trace:
+            self.add_event('reasoning', {'content': trace}, elapsed)
+
+    def _on_llm_response(self, log_entry, elapsed):
+        tool_calls = log_entry.get('tool_calls', [])
+        
+        # Emit tool calls. Skill activations are skipped here: the agent
+        # reports them itself via skill_activated/skill_activation_failed.
+        add_event = self.add_event
+        prefix_len = len(self._ACTIVATE_PREFIX)
+        for tc in tool_calls:
+            if not isinstance(tc, dict):
+                continue
+            func_name = tc.get('function')
+            if func_name and len(func_name) > prefix_len and func_name.startswith(self._ACTIVATE_PREFIX):
+                continue
+            elif func_name:
+                add_event('tool_call', {
+                    'tool_name': func_name,
+                    'arguments': tc.get('arguments', {})
+                }, elapsed)
+        
+        # Include reasoning traces if present
+        response_data = {
+            'content': log_entry.get('content', ''),
+            'tool_calls': tool_calls
+        }
+        if 'reasoning' in log_entry:
+            response_data['reasoning'] = log_entry['reasoning']
+        
+        self.add_event('llm_response', response_data, elapsed)
+
+    def _on_tool_execution(self, log_entry, elapsed):
+        result = log_entry.get('result', {})
+        
+        # Check for errors at multiple levels
+        is_error = False
+        if isinstance(result, dict):
+            if 'error' in result:
+                is_error = True
+            elif 'result' in result:
+                nested = result['result']
+                if isinstance(nested, dict) and 'error' in nested:
                     is_error = True
-                elif 'result' in result:
-                    nested = result['result']
-                    if isinstance(nested, dict) and 'error' in nested:
-                        is_error = True
-                    elif isinstance(nested, str):
-                        # Try parsing JSON string
-                        try:
-                            import json as json_module
-                            parsed = json_module.loads(nested)
-                            if isinstance(parsed, dict) and 'error' in parsed:
-                                is_error = True
-                        except:
-                            # Check for error keywords in string
-                            if 'error' in nested.lower() or 'failed' in nested.lower():
-                                is_error = True
-            
-            script = log_entry.get('script', '') if isinstance(log_entry, dict) else ''
-            
-            self.add_event('tool_result', {
-                'tool_name': script,
-                'result': result,
-                'error': is_error
-            }, elapsed)
-            
-            # Check for task creation
-            # Result is nested: result.result contains the actual JSON string
-            if script in ['create_task', 'create_subquestion_task', 'create_subquestion_tasks'] and isinstance(result, dict):
-                actual_result = result.get('result', '')
-                if isinstance(actual_result, str):
+                elif isinstance(nested, str):
+                    # Try parsing JSON string
                     try:
-                        result_data = json.loads(actual_result)
-                        if result_data.get('status') == 'success':
-                            # Handle new format with multiple tasks
-                            if 'tasks' in result_data:
-                                for task in result_data.get('tasks', []):
-                                    task_status = 'active' if task.get('task_number') == 1 else 'incomplete'
-                                    self.add_event('task_created', {
-                                        'task_number': task.get('task_number'),
-                                        'description': task.get('description'),
-                                        'status': task_status
-                                    }, elapsed)
-                            # Handle old format with single task
-                            elif 'task_number' in result_data:
-                                task_status = 'active' if result_data.get('is_active') else 'incomplete'
-                                self.add_event('task_created', {
-                                    'task_number': result_data.get('task_number'),
-                                    'description': result_data.get('description'),
-                                    'status': task_status
-                                }, elapsed)
+                        parsed = orjson.loads(nested)
+                        if isinstance(parsed, dict) and 'error' in parsed:
+                            is_error = True
                     except:
-                        pass
-                    
-        elif event_type == 'task_completed':
-            # Task marked as complete
-            task_number = log_entry.get('task_number') if isinstance(log_entry, dict) else None
-            if task_number:
-                self.add_event('task_completed', {'task_number': task_number}, elapsed)
-        elif event_type == 'task_activated':
-            # Task auto-activated
-            task_number = log_entry.get('task_number') if isinstance(log_entry, dict) else None
-            if task_number:
-                self.add_event('task_activated', {'task_number': task_number}, elapsed)
-        elif event_type == 'final_response':
-            content = log_entry.get('content', '') if isinstance(log_entry, dict) else ''
-            new_files = log_entry.get('new_files', []) if isinstance(log_entry, dict) else []
-            
-            # Filter to only include image files
-            image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp'}
-            image_files = [
-                f for f in new_files 
-                if any(f.get('path', '').lower().endswith(ext) for ext in image_extensions)
-            ]
-            
-            self.add_event('final_response', {
-                'content': content,
-                'new_files': image_files
+                        # Check for error keywords in string
+                        if 'error' in nested.lower() or 'failed' in nested.lower():
+                            is_error = True
+        
+        script = log_entry.get('script', '')
+        
+        self.add_event('tool_result', {
+            'tool_name': script,
+            'result': result,
+            'error': is_error
+        }, elapsed)
+        
+        # Check for task creation
+        # Result is nested: result.result contains the actual JSON string
+        if script in self._TASK_CREATION_TOOLS and isinstance(result, dict):
+            self._emit_created_tasks(result.get('result', ''), elapsed)
+
+    def _emit_created_tasks(self, actual_result, elapsed):
+        """Emit task_created events from a task-creation tool's JSON result"""
+        # Cheap prefix check so plain-text results never hit the parser
+        if not isinstance(actual_result, str) or actual_result[:1] not in ('{', '['):
+            return
+        try:
+            result_data = orjson.loads(actual_result)
+        except orjson.JSONDecodeError:
+            return
+        if not isinstance(result_data, dict) or result_data.get('status') != 'success':
+            return
+        # Handle new format with multiple tasks
+        if 'tasks' in result_data:
+            for task in result_data.get('tasks', []):
+                task_status = 'active' if task.get('task_number') == 1 else 'incomplete'
+                self.add_event('task_created', {
+                    'task_number': task.get('task_number'),
+                    'description': task.get('description'),
+                    'status': task_status
+                }, elapsed)
+        # Handle old format with single task
+        elif 'task_number' in result_data:
+            task_status = 'active' if result_data.get('is_active') else 'incomplete'
+            self.add_event('task_created', {
+                'task_number': result_data.get('task_number'),
+                'description': result_data.get('description'),
+                'status': task_status
             }, elapsed)
+
+    def _on_task_completed(self, log_entry, elapsed):
+        task_number = log_entry.get('task_number')
+        if task_number:
+            self.add_event('task_completed', {'task_number': task_number}, elapsed)
+
+    def _on_task_activated(self, log_entry, elapsed):
+        task_number = log_entry.get('task_number')
+        if task_number:
+            self.add_event('task_activated', {'task_number': task_number}, elapsed)
+
+    def _on_final_response(self, log_entry, elapsed):
+        new_files = log_entry.get('new_files') or []
+        
+        # Filter to only include image files
+        image_files = [
+            f for f in new_files
+            if f.get('path', '').lower().endswith(self._IMAGE_EXTENSIONS)
+        ]
         
+        self.add_event('final_response', {
+            'content': log_entry.get('content', ''),
+            'new_files': image_files
+        }, elapsed)
+
+    # Agent log entry type -> handler converting it to web UI events
+    _HANDLERS = {
+        'user_input': _on_user_input,
+        'skill_activated': _on_skill_activated,
+        'skill_deactivated': _on_skill_deactivated,
+        'skill_activation_failed': _on_skill_activation_failed,
+        'reasoning_trace': _on_reasoning_trace,
+        'llm_response': _on_llm_response,
+        'tool_execution': _on_tool_execution,
+        'task_completed': _on_task_completed,
+        'task_activated': _on_task_activated,
+        'final_response': _on_final_response,
+    }
+    _ACTIVATE_PREFIX = 'activate_'
+    _TASK_CREATION_TOOLS = frozenset({'create_task', 'create_subquestion_task', 'create_subquestion_tasks'})
+    _IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+
+    def _format_timestamp(self, t):
+        """Format a local ISO timestamp, reusing the date/time prefix within a second"""
+        second = int(t)
+        if second != self._ts_second:
+            self._ts_second = second
+            self._ts_prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(second))
+        micros = min(round((t - second) * 1000000), 999999)
+        return f"{self._ts_prefix}.{micros:06d}"
+
     def add_event(self, event_type, data, elapsed):
         """Add an event to the events list and optionally to queue for streaming"""
-        event_timestamp = datetime.fromtimestamp(self.start_time + elapsed)
-        
         event = {
             'type': event_type,
             'data': data,
-            'timestamp': event_timestamp.isoformat(),
+            'timestamp': self._format_timestamp(self.start_time + elapsed),
             'elapsed': elapsed
         }
         
@@ -295,9 +444,11 @@ class WebAgentWrapper:
         if self.persist_event:
             self.persist_event(event)
         
-        # If we have a queue, push event for real-time streaming
+        # If we have a queue, push event for real-time streaming.
+        # The frame is encoded here on the agent thread so the streaming
+        # thread only has to write bytes to the connection.
         if self.event_queue is not None:
-            self.event_queue.put(event)
+            self.event_queue.put((event, sse_frame(event)))
     
     def run(self, user_input):
         """Run the agent with event tracking - delegates to AgentSkillsFramework"""
@@ -332,12 +483,21 @@ def index():
 @app.route('/api/status')
 def status():
     """Get current status"""
-    with state_lock:
-        return jsonify({
-            'running': agent_state['running'],
-            'elapsed_time': agent_state['elapsed_time'],
-            'skills_loaded': agent_state['skills_loaded']
-        })
+    now = time.monotonic()
+    body = _status_cache['body']
+    if body is not None and now - _status_cache['ts'] < STATUS_CACHE_TTL:
+        return Response(body, mimetype='application/json')
+
+    # The run mutex is the source of truth for "running"; elapsed_time is a
+    # single value read, so neither needs state_lock
+    body = (
+        b'{"running":' + orjson.dumps(run_mutex.locked()) +
+        b',"elapsed_time":' + orjson.dumps(agent_state['elapsed_time']) +
+        b',"skills_loaded":' + _skills_loaded_json + b'}'
+    )
+    _status_cache['body'] = body
+    _status_cache['ts'] = now
+    return Response(body, mimetype='application/json')
 
 
 @app.route('/api/run', methods=['POST'])
@@ -363,6 +523,11 @@ def run_agent():
     pid = os.getpid()
     print(f"[{client_ip}] User query: {user_input} (session: {session_id}, pid: {pid})")
     
+    # All sessions share one agent instance, so only one run may proceed
+    if not run_mutex.acquire(blocking=False):
+        print(f"[{client_ip}] Reject run: agent busy (session: {session_id}, pid: {pid})")
+        return jsonify({'error': 'Agent is already running. Try again when the current run finishes.'}), 400
+    
     # Initialize session state
     with sessions_lock:
         if session_id not in sessions:
@@ -380,6 +545,7 @@ def run_agent():
         
         if session_state['running']:
             print(f"[{client_ip}] Reject run: session already running (session: {session_id}, pid: {pid})")
+            run_mutex.release()
             return jsonify({'error': 'Agent is already running for this session'}), 400
         session_state['running'] = True
         session_state['start_time'] = time.time()
@@ -397,9 +563,9 @@ def run_agent():
     with state_lock:
         agent_state['running'] = True
         agent_state['start_time'] = session_state['start_time']
-        agent_state['logs'] = []
-        agent_state['chat_history'] = []
-        agent_state['tools_called'] = []
+        agent_state['logs'].clear()
+        agent_state['chat_history'].clear()
+        agent_state['tools_called'].clear()
 
     def apply_event_to_state(target_state, event):
         target_state['elapsed_time'] = event['elapsed']
@@ -424,40 +590,49 @@ def run_agent():
         elif event['type'] == 'tool_result':
             target_state['chat_history'].append({
                 'role': 'tool',
-                'content': json.dumps(event['data']['result']),
+                'content': orjson.dumps(event['data']['result'], option=orjson.OPT_NON_STR_KEYS).decode(),
                 'tool_name': event['data']['tool_name'],
                 'timestamp': event['timestamp']
             })
 
-    def update_state_from_event(event):
-        """Persist event to session state and global agent state"""
+    def update_state_from_events(events):
+        """Persist a batch of events to session state and global agent state"""
         with sessions_lock:
-            apply_event_to_state(session_state, event)
+            for event in events:
+                apply_event_to_state(session_state, event)
 
         with state_lock:
-            apply_event_to_state(agent_state, event)
+            for event in events:
+                apply_event_to_state(agent_state, event)
+
+    state_writer = BatchedStateWriter(update_state_from_events)
     
-    def generate():
-        """Generate SSE events for the agent execution"""
-        event_queue = queue.Queue()
-        wrapper = WebAgentWrapper(
-            agent,
-            event_queue=event_queue,
-            persist_event=update_state_from_event
-        )
-        
-        # Run agent in background thread
-        agent_done = threading.Event()
-        agent_error = None
-        agent_response = None
-        
-        def run_agent_thread():
-            nonlocal agent_response, agent_error
+    event_queue = queue.Queue()
+    wrapper = WebAgentWrapper(
+        agent,
+        event_queue=event_queue,
+        persist_event=state_writer.add
+    )
+    
+    # Run agent on a worker thread. It is started here rather than inside
+    # generate() so run_mutex is released even if the client never reads
+    # the stream.
+    agent_error = None
+    agent_response = None
+    
+    def run_agent_thread():
+        nonlocal agent_response, agent_error
+        try:
+            agent_response, _ = wrapper.run(user_input)
+        except Exception as e:
+            agent_error = e
+        finally:
             try:
-                agent_response, _ = wrapper.run(user_input)
-            except Exception as e:
-                agent_error = e
-            finally:
+                # Make every event visible before the run is marked complete
+                try:
+                    state_writer.close()
+                except Exception as e:
+                    print(f"[{client_ip}] Failed to apply final events to session state: {e}")
                 with sessions_lock:
                     session_state['running'] = False
                     session_state['completed'] = True
@@ -468,30 +643,32 @@ def run_agent():
                     )
                 with state_lock:
                     agent_state['running'] = False
-                agent_done.set()
-        
-        agent_thread = threading.Thread(target=run_agent_thread)
-        agent_thread.start()
-        
+            finally:
+                # Always free the server for the next run and end the stream,
+                # even if updating state above failed
+                run_mutex.release()
+                event_queue.put(STREAM_END)
+    
+    agent_future = run_executor.submit(run_agent_thread)
+    
+    def generate():
+        """Generate SSE events for the agent execution"""
         try:
-            # Stream events as they come from the queue
-            while not agent_done.is_set() or not event_queue.empty():
-                try:
-                    # Wait for event with timeout so we can check if agent is done
-                    event = event_queue.get(timeout=0.1)
-                    
-                    yield f"data: {json.dumps(event)}\n\n"
-                    
-                except queue.Empty:
-                    # No events available, continue waiting
-                    continue
+            # Stream events as they come from the queue, blocking until the
+            # next one arrives instead of polling
+            while True:
+                item = event_queue.get()
+                if item is STREAM_END:
+                    break
+                _, frame = item
+                yield frame
             
-            # Wait for agent thread to finish
-            agent_thread.join()
+            # Wait for agent run to finish
+            agent_future.result()
             
             # Check for errors
             if agent_error:
-                yield f"data: {json.dumps({'type': 'error', 'message': str(agent_error)})}\n\n"
+                yield sse_frame({'type': 'error', 'message': str(agent_error)})
             else:
                 # Send completion event once per session
                 should_send_complete = False
@@ -500,12 +677,12 @@ def run_agent():
                         session_state['completed_sent'] = True
                         should_send_complete = True
                 if should_send_complete:
-                    yield f"data: {json.dumps({'type': 'complete', 'response': agent_response})}\n\n"
+                    yield sse_frame({'type': 'complete', 'response': agent_response})
             
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield sse_frame({'type': 'error', 'message': str(e)})
     
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+    return sse_response(generate())
 
 
 @app.route('/api/reconnect', methods=['POST'])
@@ -544,7 +721,7 @@ def reconnect_session():
         # Send any missed events first
         for event in missed_events:
             current_index += 1
-            yield f"data: {json.dumps(event)}\n\n"
+            yield sse_frame(event)
 
         while True:
             with sessions_lock:
@@ -558,7 +735,7 @@ def reconnect_session():
             # Send any new events since the last index
             while current_index + 1 < len(logs):
                 current_index += 1
-                yield f"data: {json.dumps(logs[current_index])}\n\n"
+                yield sse_frame(logs[current_index])
 
             # If session is completed and no more events, send completion event and stop
             if now_completed and current_index + 1 >= len(logs):
@@ -569,7 +746,7 @@ def reconnect_session():
                         current_state['completed_sent'] = True
                         should_send_complete = True
                 if should_send_complete:
-                    yield f"data: {json.dumps({'type': 'complete', 'response': 'Session resumed'})}\n\n"
+                    yield sse_frame({'type': 'complete', 'response': 'Session resumed'})
                 break
 
             # If not running and not completed, stop streaming
@@ -578,7 +755,7 @@ def reconnect_session():
 
             time.sleep(0.2)
     
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+    return sse_response(generate())
 
 
 @app.route('/api/session_status', methods=['POST'])
@@ -617,20 +794,26 @@ def get_session_status():
 @app.route('/api/chat_history')
 def get_chat_history():
     """Get the full chat history with reasoning traces injected"""
+    # Only take shallow snapshots under the lock. agent.messages is
+    # append-only during a run, so copying it afterwards at worst misses
+    # the newest message, which the next poll picks up.
     with state_lock:
-        messages_with_thinking = []
-        if agent and agent.messages:
-            for idx, msg in enumerate(agent.messages):
-                msg_copy = dict(msg)
-                # Inject thinking trace if available for this message
-                if idx in agent.reasoning_traces:
-                    msg_copy['thinking'] = agent.reasoning_traces[idx]
-                messages_with_thinking.append(msg_copy)
-        
-        return jsonify({
-            'history': agent_state['chat_history'],
-            'messages': messages_with_thinking
-        })
+        history = list(agent_state['chat_history'])
+        messages = list(agent.messages) if agent and agent.messages else []
+        reasoning_traces = dict(agent.reasoning_traces) if agent else {}
+
+    messages_with_thinking = []
+    for idx, msg in enumerate(messages):
+        msg_copy = dict(msg)
+        # Inject thinking trace if available for this message
+        if idx in reasoning_traces:
+            msg_copy['thinking'] = reasoning_traces[idx]
+        messages_with_thinking.append(msg_copy)
+    
+    return json_response({
+        'history': history,
+        'messages': messages_with_thinking
+    })
 
 
 @app.route('/health')
@@ -4,83 +4,481 @@ Evaluation script for Agent Skills Framework
 Runs test questions from CSV and judges answers
 """
 import os
+import ast
+import atexit
 import csv
+import hashlib
 import json
-import yaml
+import orjson
+import shelve
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
-from openai import OpenAI
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.table import Table
-from rich.progress import Progress
-from agent import AgentSkillsFramework
-from utils import load_config
+from utils import TokenBucket, load_config
 
 # Load environment
 load_dotenv()
 console = Console()
 
+# Judgments keyed by SHA-256 of (judge model, prompt), reused across runs.
+# shelve is not thread-safe, so all access goes through the lock.
+JUDGE_CACHE_PATH = Path("logs") / "judge_cache"
+# Last (answer, judgment) per (judge model, question, expected answer), used to
+# judge a changed answer with a short delta prompt
+JUDGE_PRIOR_PATH = Path("logs") / "judge_prior"
+_judge_cache_lock = threading.Lock()
+# Shelves opened so far this run, by path (None if the file couldn't be opened)
+_judge_shelves = {}
+
+JUDGE_MAX_ATTEMPTS = 5  # Attempts per judge request when rate limited (HTTP 429)
+
+class RateLimiter:
+    """Caps judge requests and tokens per minute with a pair of token buckets
+    
+    A limit left as None is not enforced.
+    """
+    def __init__(self, rpm=None, tpm=None):
+        self.set_limits(rpm, tpm)
+    
+    def set_limits(self, rpm=None, tpm=None):
+        self._requests = TokenBucket(rpm, rpm / 60) if rpm else None
+        self._tokens = TokenBucket(tpm, tpm / 60) if tpm else None
+    
+    def acquire(self, tokens=0):
+        """Block until one request using roughly `tokens` tokens fits within the limits"""
+        if self._requests:
+            self._requests.acquire()
+        if self._tokens and tokens:
+            self._tokens.acquire(tokens)
+
+# Shared by all judge threads; limits come from judge.rpm / judge.tpm in config.yaml
+judge_rate_limiter = RateLimiter()
+
 def load_test_questions(csv_path, num_questions=5):
     """Load test questions from CSV"""
-    questions = []
     with open(csv_path, 'r') as f:
-        reader = csv.DictReader(f)
-        for i, row in enumerate(reader):
-            if i >= num_questions:
-                break
-            questions.append({
-                'metadata': eval(row['metadata']),  # Parse dict string
+        return [
+            {
+                'metadata': ast.literal_eval(row['metadata']),  # Parse dict literal string
                 'question': row['problem'],
                 'expected_answer': row['answer']
-            })
-    return questions
-
-def judge_answer(question, expected_answer, agent_answer, judge_model, client):
-    """Use judge model to evaluate if agent answer matches expected answer"""
-    judge_prompt = f"""You are evaluating whether an AI assistant's answer matches the expected answer to a question.
+            }
+            for row in islice(csv.DictReader(f), num_questions)
+        ]
 
-Question: {question}
-
-Expected Answer: {expected_answer}
-
-Agent's Answer: {agent_answer}
+# Invariant instructions come first and the per-question fields last, so
+# providers with automatic prompt caching reuse the shared prefix across calls
+JUDGE_RUBRIC = """You are evaluating whether an AI assistant's answer matches the expected answer to a question.
 
 Does the agent's answer correctly provide the same information as the expected answer? 
 The answer doesn't need to be word-for-word identical, but it must contain the correct key information.
 
 Respond with a JSON object:
-{{
+{
+    "correct": true or false,
+    "confidence": "high", "medium" or "low",
+    "reasoning": "brief explanation of your judgment"
+}
+"""
+
+DELTA_JUDGE_RUBRIC = """An earlier answer to a question was already judged. Decide whether the new answer to the same question correctly provides the same information as the expected answer, using the previous answer and verdict as reference. Did the judgment change?
+
+Respond with a JSON object for the new answer:
+{
     "correct": true or false,
+    "confidence": "high", "medium" or "low",
     "reasoning": "brief explanation of your judgment"
-}}"""
+}
+"""
+
+def build_judge_prompt(question, expected_answer, agent_answer):
+    """Build the judge prompt for a single answer"""
+    return f"""{JUDGE_RUBRIC}
+Question: {question}
+
+Expected Answer: {expected_answer}
+
+Agent's Answer: {agent_answer}"""
+
+def build_delta_judge_prompt(question, expected_answer, prior_answer, prior_judgment, agent_answer):
+    """Build a short prompt judging a new answer against a previously judged one"""
+    prior_verdict = "correct" if prior_judgment.get('correct') else "incorrect"
+    return f"""{DELTA_JUDGE_RUBRIC}
+Question: {question}
+
+Expected Answer: {expected_answer}
+
+Previous answer: {prior_answer}
+
+Previous verdict: {prior_verdict} - {prior_judgment.get('reasoning', '')}
+
+New answer: {agent_answer}"""
+
+def _judge_cache_key(judge_model, judge_prompt):
+    """Content hash identifying a judge request"""
+    return hashlib.sha256(f"{judge_model}\n{judge_prompt}".encode()).hexdigest()
+
+def _judge_prior_key(judge_model, question, expected_answer):
+    """Content hash identifying a question across runs, whatever the answer"""
+    return hashlib.sha256(f"{judge_model}\n{question}\n{expected_answer}".encode()).hexdigest()
 
+def _judge_shelf(path):
+    """Return the open shelf for path, opening it on first use (hold the lock)"""
+    if path not in _judge_shelves:
+        try:
+            path.parent.mkdir(exist_ok=True)
+            _judge_shelves[path] = shelve.open(str(path))
+        except Exception as e:
+            console.print(f"[yellow]Judge cache {path} unavailable, continuing without it: {e}[/yellow]")
+            _judge_shelves[path] = None
+    return _judge_shelves[path]
+
+def close_judge_caches():
+    """Write out and close the judge cache shelves opened this run"""
+    with _judge_cache_lock:
+        for path, cache in _judge_shelves.items():
+            if cache is not None:
+                try:
+                    cache.close()
+                except Exception as e:
+                    console.print(f"[yellow]Failed to close judge cache {path}: {e}[/yellow]")
+        _judge_shelves.clear()
+
+# Also on Ctrl-C or an error, so judgments made before it are kept
+atexit.register(close_judge_caches)
+
+def _judge_cache_get(key, path=JUDGE_CACHE_PATH):
+    """Return a cached entry for key, or None (a broken cache counts as a miss)"""
+    with _judge_cache_lock:
+        cache = _judge_shelf(path)
+        try:
+            cached = cache.get(key) if cache is not None else None
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            console.print(f"[yellow]Judge cache read failed, treating as a miss: {e}[/yellow]")
+            return None
+
+def _judge_cache_put(key, value, path=JUDGE_CACHE_PATH):
+    """Store a successful judgment (or other cache entry); failures are only reported"""
+    with _judge_cache_lock:
+        cache = _judge_shelf(path)
+        if cache is None:
+            return
+        try:
+            cache[key] = json.dumps(value)
+        except Exception as e:
+            console.print(f"[yellow]Judge cache write failed: {e}[/yellow]")
+
+def _remember_judgment(judge_model, question, expected_answer, agent_answer, judgment):
+    """Record the latest judged answer for a question so later runs can send a delta prompt"""
+    _judge_cache_put(
+        _judge_prior_key(judge_model, question, expected_answer),
+        {'answer': agent_answer, 'judgment': judgment},
+        path=JUDGE_PRIOR_PATH
+    )
+
+def _request_judgment(client, judge_model, judge_prompt):
+    """Send one judge prompt and parse the JSON verdict
+    
+    Waits on the shared rate limiter first, and retries rate-limited (429)
+    responses honoring Retry-After, with exponential backoff otherwise.
+    """
+    # Rough estimate: ~4 characters per token plus room for the verdict
+    estimated_tokens = len(judge_prompt) // 4 + 200
+    retry_delay = 2
+    for attempt in range(JUDGE_MAX_ATTEMPTS):
+        judge_rate_limiter.acquire(estimated_tokens)
+        try:
+            response = client.chat.completions.create(
+                model=judge_model,
+                messages=[{"role": "user", "content": judge_prompt}],
+                response_format={"type": "json_object"},
+                temperature=0
+            )
+            return json.loads(response.choices[0].message.content)
+        except Exception as e:
+            if getattr(e, 'status_code', None) != 429 or attempt == JUDGE_MAX_ATTEMPTS - 1:
+                raise
+            retry_after = getattr(getattr(e, 'response', None), 'headers', {}).get('retry-after')
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = retry_delay
+            console.print(f"[yellow]Judge rate limited, retrying in {delay:.0f}s...[/yellow]")
+            time.sleep(delay)
+            retry_delay *= 2
+
+def _judge_with_model(question, expected_answer, agent_answer, judge_model, client):
+    """Ask a single judge model whether the agent answer matches the expected answer"""
+    judge_prompt = build_judge_prompt(question, expected_answer, agent_answer)
+    
     try:
-        response = client.chat.completions.create(
-            model=judge_model,
-            messages=[{"role": "user", "content": judge_prompt}],
-            response_format={"type": "json_object"}
-        )
+        # Identical prompts were already judged by an earlier run
+        cache_key = _judge_cache_key(judge_model, judge_prompt)
+        cached = _judge_cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # A different answer to an already judged question only needs a delta
+        # prompt; anything short of a confident verdict falls back to the full one
+        prior = _judge_cache_get(_judge_prior_key(judge_model, question, expected_answer), path=JUDGE_PRIOR_PATH)
+        if prior is not None:
+            delta_prompt = build_delta_judge_prompt(question, expected_answer, prior['answer'], prior['judgment'], agent_answer)
+            delta_key = _judge_cache_key(judge_model, delta_prompt)
+            result = _judge_cache_get(delta_key)
+            if result is None:
+                result = _request_judgment(client, judge_model, delta_prompt)
+            if isinstance(result.get('correct'), bool) and result.get('confidence') == 'high':
+                # Cached under its own prompt, and never used as a prior itself
+                _judge_cache_put(delta_key, result)
+                return result
         
-        result = json.loads(response.choices[0].message.content)
+        result = _request_judgment(client, judge_model, judge_prompt)
+        _judge_cache_put(cache_key, result)
+        _remember_judgment(judge_model, question, expected_answer, agent_answer, result)
         return result
     except Exception as e:
         console.print(f"[red]Judge error: {e}[/red]")
         return {"correct": False, "reasoning": f"Judge failed: {str(e)}"}
 
-def run_evaluation(num_questions=5, csv_path="data/simple_qa_test_set.csv"):
-    """Run evaluation on test questions"""
+def aggregate_judgments(judge_models, judgments):
+    """Combine per-model judgments by majority vote on 'correct' (ties count as incorrect)"""
+    if len(judgments) == 1:
+        return judgments[0]
+    
+    correct_votes = sum(1 for judgment in judgments if judgment.get('correct'))
+    correct = correct_votes * 2 > len(judgments)
+    majority = next(judgment for judgment in judgments if bool(judgment.get('correct')) == correct)
+    return {
+        'correct': correct,
+        'reasoning': majority.get('reasoning', ''),
+        'unanimous': correct_votes in (0, len(judgments)),
+        'votes': [
+            {
+                'model': model,
+                'correct': bool(judgment.get('correct')),
+                'confidence': judgment.get('confidence'),
+                'reasoning': judgment.get('reasoning', '')
+            }
+            for model, judgment in zip(judge_models, judgments)
+        ]
+    }
+
+def judge_answer(question, expected_answer, agent_answer, judge_models, client):
+    """Use the judge model(s) to evaluate if agent answer matches expected answer
+    
+    With several judge models, they are queried in parallel and the verdict
+    is decided by majority vote.
+    """
+    if len(judge_models) == 1:
+        return _judge_with_model(question, expected_answer, agent_answer, judge_models[0], client)
+    
+    with ThreadPoolExecutor(max_workers=len(judge_models)) as pool:
+        judgments = list(pool.map(
+            lambda model: _judge_with_model(question, expected_answer, agent_answer, model, client),
+            judge_models
+        ))
+    return aggregate_judgments(judge_models, judgments)
+
+def judge_answers_batch(items, judge_model, client, poll_interval=30):
+    """
+    Judge (question, expected_answer, agent_answer) triples in a single Batch API job.
+    
+    Requires a judge endpoint that implements the OpenAI Batch API. Answers
+    already in the judge cache are not resubmitted. Returns judgments in the
+    same order as items.
+    """
+    prompts = [build_judge_prompt(*item) for item in items]
+    cache_keys = [_judge_cache_key(judge_model, prompt) for prompt in prompts]
+    judgments = [_judge_cache_get(key) for key in cache_keys]
+    misses = [idx for idx, judgment in enumerate(judgments) if judgment is None]
+    if not misses:
+        return judgments
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    batch_file = Path("logs") / f"judge_batch_{timestamp}.jsonl"
+    with open(batch_file, 'w') as f:
+        for idx in misses:
+            f.write(json.dumps({
+                "custom_id": str(idx),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": judge_model,
+                    "messages": [{"role": "user", "content": prompts[idx]}],
+                    "response_format": {"type": "json_object"},
+                    "temperature": 0
+                }
+            }) + "\n")
+    
+    try:
+        with open(batch_file, 'rb') as f:
+            input_file = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        console.print(f"[dim]Submitted judge batch {batch.id} ({len(misses)} requests, {len(items) - len(misses)} cached)[/dim]")
+        
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+        
+        if batch.status != 'completed' or not batch.output_file_id:
+            raise RuntimeError(f"batch {batch.id} ended with status '{batch.status}'")
+        output = client.files.content(batch.output_file_id).text
+    except Exception as e:
+        console.print(f"[red]Judge batch error: {e}[/red]")
+        failed = {"correct": False, "reasoning": f"Judge failed: {str(e)}"}
+        return [judgment or dict(failed) for judgment in judgments]
+    
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        idx = int(entry['custom_id'])
+        try:
+            content = entry['response']['body']['choices'][0]['message']['content']
+            judgments[idx] = json.loads(content)
+            _judge_cache_put(cache_keys[idx], judgments[idx])
+            _remember_judgment(judge_model, *items[idx], judgments[idx])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            error = entry.get('error') or e
+            judgments[idx] = {"correct": False, "reasoning": f"Judge failed: {error}"}
+    
+    return [
+        judgment or {"correct": False, "reasoning": "Judge failed: no result in batch output"}
+        for judgment in judgments
+    ]
+
+def find_resumable_results():
+    """Return the latest eval results file, or None if there is none"""
+    candidates = sorted(Path("logs").glob("eval_results_*.jsonl"))
+    return candidates[-1] if candidates else None
+
+def load_partial_results(results_file):
+    """Load results already written to a JSONL results file"""
+    results = []
+    with open(results_file, 'rb') as f:
+        for line in f:
+            try:
+                results.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # A line cut short by a crash; that question is re-run
+                continue
+    return results
+
+def ask_agent(agent, test):
+    """Run the agent on one test question
+    
+    Returns (agent_answer, execution_time, tool_calls).
+    """
+    console.print(f"[dim]Topic: {test['metadata']['topic']}[/dim]")
+    console.print(f"\n[yellow]Q:[/yellow] {test['question']}")
+    console.print(f"[green]Expected:[/green] {test['expected_answer']}")
+    
+    # Track metrics (agent.run() itself resets history to the system message)
+    start_time = time.time()
+    tool_calls = {
+        'skill_activations': [],
+        'tool_executions': []
+    }
+    
+    # Record tool calls as the agent dispatches them
+    def track_tool_call(func_name, _args):
+        if func_name.startswith('activate_'):
+            tool_calls['skill_activations'].append(func_name[len('activate_'):])
+        else:
+            tool_calls['tool_executions'].append(func_name)
+    agent.tool_call_listener = track_tool_call
+    
+    # Get agent's answer
+    console.print(f"\n[cyan]→ Asking agent...[/cyan]")
+    try:
+        agent_answer = agent.run(test['question'], max_iterations=15)
+        execution_time = time.time() - start_time
+        
+        console.print(f"\n[blue]Agent:[/blue] {agent_answer[:200]}{'...' if len(agent_answer) > 200 else ''}")
+        console.print(f"[dim]⏱ Time: {execution_time:.2f}s | Skills: {', '.join(tool_calls['skill_activations']) or 'none'} | Tools: {', '.join(tool_calls['tool_executions']) or 'none'}[/dim]")
+    except Exception as e:
+        console.print(f"[red]Error running agent: {e}[/red]")
+        agent_answer = f"ERROR: {str(e)}"
+        execution_time = time.time() - start_time
+    
+    return agent_answer, execution_time, tool_calls
+
+# Agent owned by an eval worker process, created by _init_agent_worker
+_worker_agent = None
+
+def _init_agent_worker(repo_dir):
+    """Set up an eval worker process with its own agent and working directory
+    
+    The agent and its tools use a cwd-relative scratch/ directory, so each
+    worker runs in logs/eval_workers/<pid>/ with the config, skills and data
+    linked in from the repo.
+    """
+    global _worker_agent
+    repo_dir = Path(repo_dir)
+    workdir = repo_dir / "logs" / "eval_workers" / str(os.getpid())
+    workdir.mkdir(parents=True, exist_ok=True)
+    for name in ("config.yaml", ".env", "skills", "data"):
+        link = workdir / name
+        if (repo_dir / name).exists() and not link.exists():
+            link.symlink_to(repo_dir / name)
+    os.chdir(workdir)
+    
+    from agent import AgentSkillsFramework
+    _worker_agent = AgentSkillsFramework()
+
+def evaluate_one(test):
+    """Answer one test question in an eval worker process"""
+    return ask_agent(_worker_agent, test)
+
+def run_evaluation(num_questions=5, csv_path="data/simple_qa_test_set.csv", judge_concurrency=4,
+                   batch_judge=False, single_judge=False, resume=False, agent_workers=1):
+    """Run evaluation on test questions
+    
+    Agent runs are sequential by default (the agent instance and scratch/
+    directory are shared); with agent_workers > 1 they run in a process pool,
+    one agent and working directory per process. Each answer is judged on a
+    background thread pool so judge latency overlaps with the agent runs. With batch_judge, all answers
+    are judged together in one Batch API job after the agent finishes.
+    If judge.models lists several models they vote on each answer, unless
+    single_judge is set.
+    
+    With resume, the latest results file (interrupted or finished, e.g. to
+    add questions with a larger num_questions) is continued: questions
+    already in it are skipped and new results are appended. It must come
+    from the same question set, otherwise nothing is run.
+    """
+    # Heavy imports are deferred so `python eval.py --help` starts instantly
+    from openai import OpenAI
+    from agent import AgentSkillsFramework
+    
     console.print("[bold cyan]Agent Skills Framework - Evaluation[/bold cyan]")
     console.print("=" * 80)
     
     # Load config
     config = load_config()
-    judge_model = config.get('judge', {}).get('model', 'openai/gpt-4o-mini:free')
+    judge_config = config.get('judge', {})
+    judge_model = judge_config.get('model', 'openai/gpt-4o-mini:free')
+    judge_models = judge_config.get('models') or [judge_model]
+    if single_judge:
+        judge_models = judge_models[:1]
+    judge_rate_limiter.set_limits(judge_config.get('rpm'), judge_config.get('tpm'))
     
-    # Initialize OpenAI client for judge
+    # Initialize OpenAI client for judge (shared by all judge threads so the
+    # calls reuse its pooled keep-alive connections)
     judge_client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=os.getenv("OPENROUTER_API_KEY")
+        base_url=judge_config.get('base_url', 'https://openrouter.ai/api/v1'),
+        api_key=os.getenv(judge_config.get('api_key_env', 'OPENROUTER_API_KEY'))
     )
     
     # Load test questions
@@ -92,109 +490,166 @@ def run_evaluation(num_questions=5, csv_path="data/simple_qa_test_set.csv"):
     console.print(f"\n[cyan]Initializing agent...[/cyan]")
     agent = AgentSkillsFramework()
     console.print(f"[green]✓[/green] Agent ready with model: {agent.model}")
-    console.print(f"[green]✓[/green] Judge model: {judge_model}")
+    console.print(f"[green]✓[/green] Judge model(s): {', '.join(judge_models)}")
     
-    # Results
-    results = []
+    # Stream one JSON line per result so a crash mid-eval keeps what was judged
+    results_file = find_resumable_results() if resume else None
+    prior_results = []
+    if results_file:
+        prior_results = load_partial_results(results_file)
+        completed = {r['question'] for r in prior_results}
+        # Don't mix in results from a run over another --csv or a larger -n
+        unknown = completed - {test['question'] for test in questions}
+        if unknown:
+            console.print(
+                f"[red]Cannot resume {results_file}: {len(unknown)} of its questions are not in "
+                f"this question set (different --csv or -n?)[/red]"
+            )
+            return [], 0
+        questions = [test for test in questions if test['question'] not in completed]
+        console.print(f"[green]✓[/green] Resuming {results_file}: {len(completed)} done, {len(questions)} to go")
+    else:
+        results_file = Path("logs") / f"eval_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    timestamp = results_file.stem[len("eval_results_"):]
+    summary_file = results_file.with_suffix(".summary.json")
+    results_file.parent.mkdir(exist_ok=True)
+    results_out = open(results_file, 'ab')
+    if results_out.tell():
+        # Terminate a line cut short by a crash before appending
+        with open(results_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                results_out.write(b"\n")
     
-    # Run evaluations
-    console.print(f"\n{'=' * 80}")
-    console.print("[bold]Running Evaluations[/bold]")
-    console.print("=" * 80)
+    # Answered questions awaiting a batch judgment: (test, answer info)
+    pending = []
+    results = prior_results
+    results_lock = threading.Lock()
+    judge_pool = ThreadPoolExecutor(max_workers=judge_concurrency)
     
-    for i, test in enumerate(questions, 1):
-        console.print(f"\n[bold cyan]Question {i}/{len(questions)}[/bold cyan]")
-        console.print(f"[dim]Topic: {test['metadata']['topic']}[/dim]")
-        console.print(f"\n[yellow]Q:[/yellow] {test['question']}")
-        console.print(f"[green]Expected:[/green] {test['expected_answer']}")
-        
-        # Clear agent history and reset metrics for each question
-        agent.messages = [agent.messages[0]]  # Keep only system message
-        
-        # Track metrics
-        import time
-        start_time = time.time()
-        tool_calls = {
-            'skill_activations': [],
-            'tool_executions': []
-        }
-        
-        # Monkey-patch to track tool calls
-        original_run = agent.run
-        def tracked_run(user_input, max_iterations=10):
-            # We'll track from the conversation log
-            return original_run(user_input, max_iterations)
-        
-        # Get agent's answer
-        console.print(f"\n[cyan]→ Asking agent...[/cyan]")
-        try:
-            agent_answer = agent.run(test['question'], max_iterations=15)
-            execution_time = time.time() - start_time
-            
-            # Parse tool calls from conversation history
-            for msg in agent.messages:
-                if msg.get('role') == 'assistant' and msg.get('tool_calls'):
-                    for tc in msg['tool_calls']:
-                        func_name = tc['function']['name']
-                        if func_name.startswith('activate_'):
-                            skill_name = func_name.replace('activate_', '')
-                            tool_calls['skill_activations'].append(skill_name)
-                        else:
-                            tool_calls['tool_executions'].append(func_name)
-            
-            console.print(f"\n[blue]Agent:[/blue] {agent_answer[:200]}{'...' if len(agent_answer) > 200 else ''}")
-            console.print(f"[dim]⏱ Time: {execution_time:.2f}s | Skills: {', '.join(tool_calls['skill_activations']) or 'none'} | Tools: {', '.join(tool_calls['tool_executions']) or 'none'}[/dim]")
-        except Exception as e:
-            console.print(f"[red]Error running agent: {e}[/red]")
-            agent_answer = f"ERROR: {str(e)}"
-            execution_time = time.time() - start_time
-        
-        # Judge the answer
-        console.print(f"\n[cyan]→ Judging answer...[/cyan]")
-        judgment = judge_answer(
-            test['question'],
-            test['expected_answer'],
-            agent_answer,
-            judge_model,
-            judge_client
-        )
-        
-        # Display judgment
-        if judgment['correct']:
-            console.print(f"[bold green]✓ CORRECT[/bold green]")
-        else:
-            console.print(f"[bold red]✗ INCORRECT[/bold red]")
-        console.print(f"[dim]{judgment['reasoning']}[/dim]")
-        
-        # Store result with metrics
-        results.append({
+    def record_result(test, agent_answer, execution_time, tool_calls, judgment):
+        # Store result with metrics and append it to the results file right
+        # away, so an interrupted run keeps every answer judged so far
+        result = {
             'question': test['question'],
             'expected': test['expected_answer'],
             'agent_answer': agent_answer,
             'correct': judgment['correct'],
             'reasoning': judgment['reasoning'],
+            'judge_votes': judgment.get('votes'),
+            'judges_unanimous': judgment.get('unanimous', True),
             'metadata': test['metadata'],
             'execution_time': execution_time,
             'skill_activations': tool_calls['skill_activations'],
             'tool_executions': tool_calls['tool_executions'],
             'num_skill_activations': len(tool_calls['skill_activations']),
             'num_tool_executions': len(tool_calls['tool_executions'])
-        })
+        }
+        with results_lock:
+            results.append(result)
+            results_out.write(orjson.dumps(result) + b"\n")
+            results_out.flush()
+            
+            # Display judgment
+            console.print(f"\n[bold cyan]Judged:[/bold cyan] [dim]{test['question']}[/dim]")
+            if judgment['correct']:
+                console.print(f"[bold green]✓ CORRECT[/bold green]")
+            else:
+                console.print(f"[bold red]✗ INCORRECT[/bold red]")
+            console.print(f"[dim]{judgment['reasoning']}[/dim]")
+            if not judgment.get('unanimous', True):
+                console.print("[yellow]⚠ Judges disagreed[/yellow]")
+    
+    # Run evaluations
+    console.print(f"\n{'=' * 80}")
+    console.print("[bold]Running Evaluations[/bold]")
+    console.print("=" * 80)
+    
+    def submit_judgment(test, agent_answer, execution_time, tool_calls):
+        if batch_judge:
+            pending.append((test, agent_answer, execution_time, tool_calls))
+        else:
+            # Judge the answer in the background while the next question runs;
+            # the result is written as soon as its judgment comes back
+            console.print(f"\n[cyan]→ Judging answer in background...[/cyan]")
+            future = judge_pool.submit(
+                judge_answer,
+                test['question'],
+                test['expected_answer'],
+                agent_answer,
+                judge_models,
+                judge_client
+            )
+            
+            def on_judged(future):
+                try:
+                    judgment = future.result()
+                except Exception as e:
+                    judgment = {"correct": False, "reasoning": f"Judge failed: {str(e)}"}
+                record_result(test, agent_answer, execution_time, tool_calls, judgment)
+            future.add_done_callback(on_judged)
         
         console.print("-" * 80)
     
+    if agent_workers > 1:
+        console.print(f"[dim]Answering {len(questions)} questions with {agent_workers} agent processes[/dim]")
+        with ProcessPoolExecutor(
+            max_workers=agent_workers,
+            initializer=_init_agent_worker,
+            initargs=(str(Path.cwd()),)
+        ) as agent_pool:
+            futures = {agent_pool.submit(evaluate_one, test): test for test in questions}
+            for future in as_completed(futures):
+                test = futures[future]
+                console.print(f"\n[bold cyan]Answered:[/bold cyan] {test['question']}")
+                submit_judgment(test, *future.result())
+    else:
+        for i, test in enumerate(questions, 1):
+            console.print(f"\n[bold cyan]Question {i}/{len(questions)}[/bold cyan]")
+            submit_judgment(test, *ask_agent(agent, test))
+    
+    if batch_judge:
+        console.print(f"\n{'=' * 80}")
+        console.print("[bold]Judgments[/bold]")
+        console.print("=" * 80)
+        console.print(f"\n[cyan]→ Judging {len(pending)} answers with the Batch API...[/cyan]")
+        batch_items = [
+            (test['question'], test['expected_answer'], agent_answer)
+            for test, agent_answer, _, _ in pending
+        ]
+        per_model = [judge_answers_batch(batch_items, model, judge_client) for model in judge_models]
+        for answer, judgments in zip(pending, zip(*per_model)):
+            record_result(*answer, aggregate_judgments(judge_models, list(judgments)))
+    
+    # Waits for the outstanding judgments (and their result writes)
+    judge_pool.shutdown()
+    results_out.close()
+    close_judge_caches()
+    
     # Summary
     console.print(f"\n{'=' * 80}")
     console.print("[bold]Evaluation Summary[/bold]")
     console.print("=" * 80)
     
-    correct_count = sum(1 for r in results if r['correct'])
-    accuracy = (correct_count / len(results)) * 100 if results else 0
+    # Imported here so `eval.py --help` doesn't pay for numpy
+    import numpy as np
+    
+    # Calculate aggregate metrics over per-result arrays
+    n = len(results)
+    correct = np.fromiter((r['correct'] for r in results), dtype=np.bool_, count=n)
+    times = np.fromiter((r['execution_time'] for r in results), dtype=np.float64, count=n)
+    skill_counts = np.fromiter((r['num_skill_activations'] for r in results), dtype=np.int64, count=n)
+    tool_counts = np.fromiter((r['num_tool_executions'] for r in results), dtype=np.int64, count=n)
+    unanimous = np.fromiter((r['judges_unanimous'] for r in results), dtype=np.bool_, count=n)
     
-    # Calculate aggregate metrics
-    avg_time = sum(r['execution_time'] for r in results) / len(results) if results else 0
-    total_skill_activations = sum(r['num_skill_activations'] for r in results)
-    total_tool_executions = sum(r['num_tool_executions'] for r in results)
+    correct_count = int(correct.sum())
+    accuracy = float(correct.mean()) * 100 if n else 0
+    avg_time = float(times.mean()) if n else 0
+    std_time = float(times.std()) if n else 0
+    p50_time, p95_time, p99_time = (float(p) for p in np.percentile(times, [50, 95, 99])) if n else (0, 0, 0)
+    total_skill_activations = int(skill_counts.sum())
+    total_tool_executions = int(tool_counts.sum())
+    disagreement_rate = float((~unanimous).mean()) * 100 if n else 0
     
     # Create summary table
     table = Table(show_header=True, header_style="bold cyan")
@@ -205,31 +660,36 @@ def run_evaluation(num_questions=5, csv_path="data/simple_qa_test_set.csv"):
     table.add_row("Correct", str(correct_count))
     table.add_row("Incorrect", str(len(results) - correct_count))
     table.add_row("Accuracy", f"{accuracy:.1f}%")
-    table.add_row("Avg Time", f"{avg_time:.2f}s")
+    table.add_row("Avg Time", f"{avg_time:.2f}s (± {std_time:.2f}s)")
+    table.add_row("Time p50 / p95 / p99", f"{p50_time:.2f}s / {p95_time:.2f}s / {p99_time:.2f}s")
     table.add_row("Total Skill Activations", str(total_skill_activations))
     table.add_row("Total Tool Executions", str(total_tool_executions))
+    if len(judge_models) > 1:
+        table.add_row("Judge Disagreement", f"{disagreement_rate:.1f}%")
     
     console.print(table)
     
-    # Save results
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    results_file = Path("logs") / f"eval_results_{timestamp}.json"
-    
-    with open(results_file, 'w') as f:
-        json.dump({
+    # Save summary next to the streamed results
+    with open(summary_file, 'wb') as f:
+        f.write(orjson.dumps({
             'timestamp': timestamp,
             'num_questions': len(results),
             'correct': correct_count,
             'accuracy': accuracy,
             'avg_execution_time': avg_time,
+            'std_execution_time': std_time,
+            'execution_time_percentiles': {'p50': p50_time, 'p95': p95_time, 'p99': p99_time},
             'total_skill_activations': total_skill_activations,
             'total_tool_executions': total_tool_executions,
             'model': agent.model,
             'judge_model': judge_model,
-            'results': results
-        }, f, indent=2)
+            'judge_models': judge_models,
+            'judge_disagreement_rate': disagreement_rate,
+            'results_file': str(results_file)
+        }))
     
     console.print(f"\n[green]✓[/green] Results saved to: {results_file}")
+    console.print(f"[green]✓[/green] Summary saved to: {summary_file}")
     
     return results, accuracy
 
@@ -241,7 +701,25 @@ if __name__ == "__main__":
                        help='Number of questions to evaluate (default: 5)')
     parser.add_argument('--csv', default='data/simple_qa_test_set.csv',
                        help='Path to CSV file with test questions')
+    parser.add_argument('--judge-concurrency', type=int, default=4,
+                       help='Number of judge calls to run in parallel (default: 4)')
+    parser.add_argument('--batch-judge', action='store_true',
+                       help='Judge all answers in one Batch API job (requires a judge endpoint with Batch API support)')
+    parser.add_argument('--single-judge', action='store_true',
+                       help='Use only the first judge model instead of a majority vote across judge.models')
+    parser.add_argument('--agent-workers', type=int, default=1,
+                       help='Number of agent processes answering questions in parallel (default: 1)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue the latest results file, skipping questions it already has')
     
     args = parser.parse_args()
     
-    run_evaluation(num_questions=args.num_questions, csv_path=args.csv)
+    run_evaluation(
+        num_questions=args.num_questions,
+        csv_path=args.csv,
+        judge_concurrency=args.judge_concurrency,
+        batch_judge=args.batch_judge,
+        single_judge=args.single_judge,
+        resume=args.resume,
+        agent_workers=args.agent_workers
+    )
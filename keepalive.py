@@ -3,10 +3,16 @@
 Background task to keep the Render service alive using rotating proxies
 Runs every 9 minutes to prevent the free tier from spinning down
 """
+import re
 import sys
+import json
 import time
+import random
 import requests
+from requests.adapters import HTTPAdapter
 import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -20,6 +26,13 @@ INTERVAL_SECONDS = 9 * 60  # 9 minutes
 REQUEST_TIMEOUT = 10  # seconds for testing proxies
 PING_TIMEOUT = 30  # seconds for pinging Render (longer for slower proxies)
 MAX_PING_RETRIES = 3  # Retry pinging with same proxy if it fails
+DIRECT_PING_TIMEOUT = 5  # seconds for pinging Render without a proxy
+PROXY_TEST_WORKERS = 50  # Proxies tested concurrently while searching
+MAX_PROXIES_TO_TEST = 5000  # Proxies a search of the full list tests at most
+FAILING_RUN_PROXIES_TO_TEST = 500  # Smaller search once the previous run failed
+
+# IPv4:PORT; anything else would only burn a test timeout
+_PROXY_RE = re.compile(r'^(?:\d{1,3}\.){3}\d{1,3}:\d{1,5}$')
 
 # Spinner characters
 SPINNER_CHARS = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
@@ -27,7 +40,33 @@ SPINNER_CHARS = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇',
 # Data directory for persistent proxy cache
 DATA_DIR = Path("data")
 PROXY_LIST_FILE = DATA_DIR / "proxy_list.txt"
-LAST_PROXY_FILE = DATA_DIR / "proxy_ip.txt"
+PROXY_SCORES_FILE = DATA_DIR / "proxy_scores.json"
+MAX_SCORED_PROXIES = 100  # Scoreboard entries kept, best first
+
+# Handling of repeated failed runs
+PROXY_LIST_REFRESH_FAILURES = 3  # Re-download the proxy list after this many failed runs in a row
+
+# Set by stop_keepalive() to end run_keepalive_loop between runs
+_stop_event = threading.Event()
+
+# Per-thread sessions (requests.Session is not guaranteed thread-safe) so
+# repeat requests from a thread (ping retries, the next cycle's ping via the
+# same proxy, a test worker's next probe) reuse pooled connections instead of
+# a fresh TCP/TLS handshake
+_tls = threading.local()
+
+
+def _session():
+    """Return this thread's pooled requests session, creating it on first use"""
+    session = getattr(_tls, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers['User-Agent'] = 'Mozilla/5.0'
+        adapter = HTTPAdapter(pool_connections=PROXY_TEST_WORKERS, pool_maxsize=PROXY_TEST_WORKERS, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _tls.session = session
+    return session
 
 
 def fetch_proxy_list():
@@ -36,7 +75,7 @@ def fetch_proxy_list():
     if PROXY_LIST_FILE.exists():
         try:
             with open(PROXY_LIST_FILE, 'r') as f:
-                proxies = [line.strip() for line in f if line.strip() and ':' in line]
+                proxies = [line.strip() for line in f if _PROXY_RE.match(line.strip())]
             if proxies:
                 print(f"[Keepalive] ✓ Loaded {len(proxies)} proxies from cache")
                 return proxies
@@ -46,20 +85,23 @@ def fetch_proxy_list():
     # Download fresh list
     try:
         print(f"[Keepalive] Downloading proxy list from {PROXY_LIST_URL}...")
-        response = requests.get(PROXY_LIST_URL, timeout=30)
-        response.raise_for_status()
+        DATA_DIR.mkdir(exist_ok=True)
+        partial_file = PROXY_LIST_FILE.with_suffix('.tmp')
         
-        # Parse proxies (format: IP:PORT)
+        # Parse proxies (format: IP:PORT) as the body streams in, caching as we go
         proxies = []
-        for line in response.text.strip().split('\n'):
-            line = line.strip()
-            if line and ':' in line:
-                proxies.append(line)
+        with _session().get(PROXY_LIST_URL, timeout=30, stream=True) as response, \
+                open(partial_file, 'w') as f:
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                line = line.strip()
+                if _PROXY_RE.match(line):
+                    proxies.append(line)
+                    f.write(line + '\n')
         
-        # Save to cache
-        DATA_DIR.mkdir(exist_ok=True)
-        with open(PROXY_LIST_FILE, 'w') as f:
-            f.write('\n'.join(proxies))
+        # Only replace the cache once the whole list arrived
+        partial_file.replace(PROXY_LIST_FILE)
         
         print(f"[Keepalive] ✓ Fetched and cached {len(proxies)} proxies")
         return proxies
@@ -68,27 +110,50 @@ def fetch_proxy_list():
         return []
 
 
-def get_last_working_proxy():
-    """Load the last working proxy from cache"""
-    if LAST_PROXY_FILE.exists():
+def _proxy_score(stats):
+    """Sort key for a scoreboard entry: net successes, then most recently working"""
+    return (stats.get('successes', 0) - stats.get('failures', 0), stats.get('last_ok_ts', 0))
+
+
+def load_scoreboard():
+    """Load the proxy scoreboard: {proxy: {successes, failures, last_ok_ts}}"""
+    if PROXY_SCORES_FILE.exists():
         try:
-            with open(LAST_PROXY_FILE, 'r') as f:
-                proxy = f.read().strip()
-            if proxy and ':' in proxy:
-                return proxy
+            with open(PROXY_SCORES_FILE, 'r') as f:
+                return {
+                    proxy: stats for proxy, stats in json.load(f).items()
+                    if _PROXY_RE.match(proxy) and isinstance(stats, dict)
+                }
         except Exception as e:
-            print(f"[Keepalive] ⚠ Failed to load last proxy: {e}")
-    return None
+            print(f"[Keepalive] ⚠ Failed to load proxy scoreboard: {e}")
+    return {}
 
 
-def save_last_working_proxy(proxy):
-    """Save the working proxy to cache"""
+def update_scoreboard(proxy, ok):
+    """Record a ping outcome for a proxy, keeping the best MAX_SCORED_PROXIES entries"""
+    scoreboard = load_scoreboard()
+    stats = scoreboard.setdefault(proxy, {'successes': 0, 'failures': 0, 'last_ok_ts': 0})
+    if ok:
+        stats['successes'] += 1
+        stats['last_ok_ts'] = time.time()
+    else:
+        stats['failures'] += 1
+    
+    best = sorted(scoreboard, key=lambda p: _proxy_score(scoreboard[p]), reverse=True)[:MAX_SCORED_PROXIES]
     try:
         DATA_DIR.mkdir(exist_ok=True)
-        with open(LAST_PROXY_FILE, 'w') as f:
-            f.write(proxy)
+        with open(PROXY_SCORES_FILE, 'w') as f:
+            json.dump({p: scoreboard[p] for p in best}, f)
     except Exception as e:
-        print(f"[Keepalive] ⚠ Failed to save last proxy: {e}")
+        print(f"[Keepalive] ⚠ Failed to save proxy scoreboard: {e}")
+
+
+def ranked_proxies(scoreboard):
+    """Proxies that have worked more often than not, best first"""
+    return [
+        proxy for proxy in sorted(scoreboard, key=lambda p: _proxy_score(scoreboard[p]), reverse=True)
+        if _proxy_score(scoreboard[proxy])[0] > 0
+    ]
 
 
 def test_proxy(proxy):
@@ -99,11 +164,10 @@ def test_proxy(proxy):
             'https': f'http://{proxy}'
         }
         
-        response = requests.get(
+        response = _session().get(
             TEST_URL,
             proxies=proxy_dict,
-            timeout=REQUEST_TIMEOUT,
-            headers={'User-Agent': 'Mozilla/5.0'}
+            timeout=REQUEST_TIMEOUT
         )
         
         return response.status_code == 200
@@ -111,6 +175,20 @@ def test_proxy(proxy):
         return False
 
 
+def ping_service_direct():
+    """Ping the Render service without a proxy; any request keeps it awake"""
+    try:
+        print(f"[Keepalive] Pinging {TARGET_URL} directly...")
+        response = _session().get(TARGET_URL, timeout=DIRECT_PING_TIMEOUT)
+        if response.status_code == 200:
+            print(f"[Keepalive] ✓ Successfully pinged {TARGET_URL} directly")
+            return True
+        print(f"[Keepalive] ⚠ Direct ping returned status {response.status_code}")
+    except Exception as e:
+        print(f"[Keepalive] ⚠ Direct ping failed: {e}")
+    return False
+
+
 def ping_service_via_proxy(proxy):
     """Ping the Render service using a working proxy"""
     for attempt in range(MAX_PING_RETRIES):
@@ -123,11 +201,10 @@ def ping_service_via_proxy(proxy):
             retry_msg = f" (retry {attempt + 1}/{MAX_PING_RETRIES})" if attempt > 0 else ""
             print(f"[Keepalive] Pinging {TARGET_URL} via proxy {proxy}{retry_msg}...")
             
-            response = requests.get(
+            response = _session().get(
                 TARGET_URL,
                 proxies=proxy_dict,
-                timeout=PING_TIMEOUT,
-                headers={'User-Agent': 'Mozilla/5.0'}
+                timeout=PING_TIMEOUT
             )
             
             print(f"[Keepalive] ✓ Successfully pinged {TARGET_URL} - Status: {response.status_code}")
@@ -135,7 +212,10 @@ def ping_service_via_proxy(proxy):
             
         except Exception as e:
             if attempt < MAX_PING_RETRIES - 1:
-                print(f"[Keepalive] ⚠ Attempt {attempt + 1} failed, retrying...")
+                # Exponential backoff with jitter before retrying the same proxy
+                delay = 2 ** attempt + random.random()
+                print(f"[Keepalive] ⚠ Attempt {attempt + 1} failed, retrying in {delay:.1f}s...")
+                time.sleep(delay)
                 continue
             else:
                 print(f"[Keepalive] ✗ Failed to ping via {proxy} after {MAX_PING_RETRIES} attempts: {e}")
@@ -144,77 +224,114 @@ def ping_service_via_proxy(proxy):
     return False
 
 
-def find_working_proxy(proxies, start_index=0):
-    """Find a working proxy starting from the given index"""
-    max_proxies_to_test = 5000
+def find_working_proxy(proxies, start_index=0, max_proxies_to_test=MAX_PROXIES_TO_TEST):
+    """Find a working proxy starting from the given index
+    
+    Proxies are tested concurrently, at most PROXY_TEST_WORKERS at a time and
+    submitted in list order from start_index as slots free up; the first one
+    to succeed is returned and the rest are dropped.
+    """
     proxies_tested = 0
+    end_index = min(len(proxies), start_index + max_proxies_to_test)
     
     print(f"[Keepalive] Searching for working proxy (starting at index {start_index})...")
     
-    for i in range(start_index, min(len(proxies), start_index + max_proxies_to_test)):
-        proxy = proxies[i]
-        proxies_tested += 1
-        
-        if test_proxy(proxy):
-            print(f"[Keepalive] ✓ WORKS: {proxy} (index {i}, tested {proxies_tested} proxies)", flush=True)
-            return proxy, i
+    executor = ThreadPoolExecutor(max_workers=PROXY_TEST_WORKERS)
+    indices = iter(range(start_index, end_index))
+    futures = {}
+    try:
+        while True:
+            # Top the pool up instead of queueing the whole list at once
+            for i in islice(indices, PROXY_TEST_WORKERS - len(futures)):
+                futures[executor.submit(test_proxy, proxies[i])] = i
+            if not futures:
+                break
+            
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures.pop(future)
+                proxies_tested += 1
+                if future.result():
+                    print(f"[Keepalive] ✓ WORKS: {proxies[i]} (index {i}, tested {proxies_tested} proxies)", flush=True)
+                    return proxies[i], i
+    finally:
+        # Don't wait for in-flight tests; they finish within REQUEST_TIMEOUT
+        executor.shutdown(wait=False, cancel_futures=True)
     
     print(f"[Keepalive] ✗ No working proxy found after testing {proxies_tested} proxies", flush=True)
     return None, -1
 
 
-def keepalive_task():
-    """Main keepalive task - finds working proxy and pings service"""
-    start_time = datetime.now()
-    print(f"\n{'='*80}")
-    print(f"[Keepalive] Task started at {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"{'='*80}")
+def ping_via_proxies(consecutive_failures=0):
+    """Find a working proxy and ping the service through it
+    
+    Proxies are tried in order of their track record on the scoreboard
+    before falling back to a search of the full list. After failed runs
+    that search is capped at FAILING_RUN_PROXIES_TO_TEST, each run moving
+    on to the next slice of the list. Returns the proxy that worked, or None.
+    """
+    known_proxies = ranked_proxies(load_scoreboard())
+    
+    # Try the best-scoring proxy first
+    if known_proxies:
+        best_proxy = known_proxies[0]
+        print(f"[Keepalive] Trying best known proxy: {best_proxy}")
+        if ping_service_via_proxy(best_proxy):
+            print(f"[Keepalive] ✓ Best known proxy still works!")
+            update_scoreboard(best_proxy, True)
+            return best_proxy
+        print(f"[Keepalive] ✗ Best known proxy failed after {MAX_PING_RETRIES} retries")
+        update_scoreboard(best_proxy, False)
+    
+    # Then the other proxies with a good record, tested in parallel, before
+    # any cold search of the full list
+    if len(known_proxies) > 1:
+        print(f"[Keepalive] Trying {len(known_proxies) - 1} other known good proxies...")
+        candidate, _ = find_working_proxy(known_proxies[1:])
+        if candidate:
+            if ping_service_via_proxy(candidate):
+                update_scoreboard(candidate, True)
+                return candidate
+            update_scoreboard(candidate, False)
     
     # Fetch proxy list (from cache or download)
     proxies = fetch_proxy_list()
     if not proxies:
         print("[Keepalive] ✗ No proxies available, skipping this run")
-        return False
-    
-    # Try the last working proxy first
-    last_proxy = get_last_working_proxy()
-    working_proxy = None
+        return None
     
-    if last_proxy:
-        print(f"[Keepalive] Trying last working proxy: {last_proxy}")
-        success = ping_service_via_proxy(last_proxy)
-        
-        if success:
-            print(f"[Keepalive] ✓ Last proxy still works!")
-            working_proxy = last_proxy
-        else:
-            print(f"[Keepalive] ✗ Last proxy failed after {MAX_PING_RETRIES} retries, searching for new one...")
-            
-            # Find position of failed proxy in list
-            try:
-                last_index = proxies.index(last_proxy)
-                print(f"[Keepalive] Last proxy was at index {last_index}, starting search after that...")
-                working_proxy, _ = find_working_proxy(proxies, start_index=last_index + 1)
-            except ValueError:
-                # Last proxy not in current list, start from beginning
-                print(f"[Keepalive] Last proxy not in current list, starting from beginning...")
-                working_proxy, _ = find_working_proxy(proxies, start_index=0)
+    # Known proxies were already tried above
+    tried = set(known_proxies)
+    candidates = [p for p in proxies if p not in tried]
+    if consecutive_failures and candidates:
+        # The last search came up empty; test a smaller, fresh slice instead
+        # of repeating the full search on a bad day
+        limit = FAILING_RUN_PROXIES_TO_TEST
+        start = (MAX_PROXIES_TO_TEST + (consecutive_failures - 1) * limit) % len(candidates)
     else:
-        print(f"[Keepalive] No cached proxy, searching for working one...")
-        working_proxy, _ = find_working_proxy(proxies, start_index=0)
+        limit, start = MAX_PROXIES_TO_TEST, 0
+    print(f"[Keepalive] Searching {min(limit, len(candidates))} of {len(candidates)} listed proxies for a working one...")
+    working_proxy, _ = find_working_proxy(candidates, start, limit)
     
     if not working_proxy:
         print(f"[Keepalive] ✗ No working proxy found")
-        return False
+        return None
     
-    # If we found a new proxy, ping the service
-    if working_proxy != last_proxy:
-        success = ping_service_via_proxy(working_proxy)
-        if not success:
-            return False
+    # We found a new proxy, ping the service
+    ok = ping_service_via_proxy(working_proxy)
+    update_scoreboard(working_proxy, ok)
+    return working_proxy if ok else None
+
+
+def keepalive_task(consecutive_failures=0):
+    """Main keepalive task - pings the service directly, falling back to proxies"""
+    start_time = datetime.now()
+    print(f"\n{'='*80}")
+    print(f"[Keepalive] Task started at {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"{'='*80}")
     
-    # Save the working proxy
-    save_last_working_proxy(working_proxy)
+    if not ping_service_direct() and not ping_via_proxies(consecutive_failures):
+        return False
     
     elapsed = datetime.now() - start_time
     print(f"[Keepalive] Task completed in {elapsed.total_seconds():.1f}s")
@@ -224,7 +341,16 @@ def keepalive_task():
 
 
 def run_keepalive_loop():
-    """Run the keepalive task in a loop"""
+    """Run the keepalive task in a loop
+    
+    Runs are scheduled INTERVAL_SECONDS apart measured from the start of
+    each run (on the monotonic clock), so a slow proxy search does not push
+    the next ping back. Failed runs do not stretch the interval (that would
+    let Render's 15-minute idle timeout lapse exactly when pings are failing).
+    Instead, each run after a failure searches fewer proxies, and the cached
+    proxy list is dropped every PROXY_LIST_REFRESH_FAILURES failures in a row.
+    Returns once stop_keepalive() is called.
+    """
     print(f"\n{'='*80}")
     print(f"[Keepalive] Background keepalive service starting")
     print(f"[Keepalive] Interval: {INTERVAL_SECONDS} seconds ({INTERVAL_SECONDS//60} minutes)")
@@ -232,27 +358,42 @@ def run_keepalive_loop():
     
     # Run immediately on startup
     print(f"[Keepalive] Running initial keepalive task at startup...")
-    try:
-        keepalive_task()
-    except Exception as e:
-        print(f"[Keepalive] ✗ Error in initial task: {e}")
-    
-    # Calculate and display next run time
-    next_run = datetime.now() + timedelta(seconds=INTERVAL_SECONDS)
-    print(f"[Keepalive] ⏰ Next run scheduled for: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+    initial = True
+    consecutive_failures = 0
     
-    while True:
-        # Wait for next interval
-        time.sleep(INTERVAL_SECONDS)
+    while not _stop_event.is_set():
+        run_start = time.monotonic()
         
         try:
-            keepalive_task()
+            ok = keepalive_task(consecutive_failures)
         except Exception as e:
-            print(f"[Keepalive] ✗ Error in task: {e}")
+            print(f"[Keepalive] ✗ Error in {'initial ' if initial else ''}task: {e}")
+            ok = False
+        initial = False
+        
+        if ok:
+            consecutive_failures = 0
+        else:
+            consecutive_failures += 1
+            if consecutive_failures % PROXY_LIST_REFRESH_FAILURES == 0:
+                # The cached list may be stale; fetch a fresh one next run
+                print(f"[Keepalive] ⚠ {consecutive_failures} failed runs in a row, dropping cached proxy list")
+                PROXY_LIST_FILE.unlink(missing_ok=True)
         
         # Calculate and display next run time
-        next_run = datetime.now() + timedelta(seconds=INTERVAL_SECONDS)
+        wait_seconds = max(0, run_start + INTERVAL_SECONDS - time.monotonic())
+        next_run = datetime.now() + timedelta(seconds=wait_seconds)
         print(f"[Keepalive] ⏰ Next run scheduled for: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+        
+        # Wait out the rest of the interval, waking early if stopped
+        _stop_event.wait(wait_seconds)
+    
+    print("[Keepalive] Stopped")
+
+
+def stop_keepalive():
+    """Ask the keepalive loop to exit before its next run"""
+    _stop_event.set()
 
 
 def start_keepalive_thread():
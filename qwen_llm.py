@@ -1,15 +1,31 @@
 import json
 import os
 import time
+from functools import lru_cache
 from typing import Optional, Tuple
 
-from openai import OpenAI
+from openai import AuthenticationError, OpenAI
 
 HOME = os.path.expanduser("~")
 OAUTH_FILE = os.path.join(HOME, ".qwen", "oauth_creds.json")
 
+# Reload the token this many seconds before it expires
+TOKEN_EXPIRY_MARGIN = 60
+
+# Last token read from OAUTH_FILE, reused until it nears expiry or the file changes
+_TOKEN_CACHE = {"token": None, "expiry": 0.0, "mtime": None}
+
+
+def _load_oauth_token(force_reload: bool = False) -> str:
+    mtime = os.path.getmtime(OAUTH_FILE)
+    if (
+        not force_reload
+        and _TOKEN_CACHE["token"]
+        and _TOKEN_CACHE["mtime"] == mtime
+        and time.time() < _TOKEN_CACHE["expiry"] - TOKEN_EXPIRY_MARGIN
+    ):
+        return _TOKEN_CACHE["token"]
 
-def _load_oauth_token() -> str:
     with open(OAUTH_FILE, "r", encoding="utf-8") as f:
         creds = json.load(f)
 
@@ -21,29 +37,44 @@ def _load_oauth_token() -> str:
             "Qwen OAuth token appears expired. Run `qwen` once to refresh it, then retry."
         )
 
+    _TOKEN_CACHE.update(
+        token=access_token,
+        expiry=expiry_ms / 1000 if expiry_ms else float("inf"),
+        mtime=mtime,
+    )
     return access_token
 
 
+@lru_cache(maxsize=4)
+def _get_client(base_url: str, access_token: str) -> OpenAI:
+    # One client (and connection pool) per endpoint and token
+    return OpenAI(
+        api_key=access_token,
+        base_url=base_url,
+    )
+
+
 def qwen_chat(
     prompt: str,
     model: Optional[str] = None,
     base_url: Optional[str] = None,
     temperature: float = 0.2,
 ) -> Tuple[str, Optional[dict]]:
-    access_token = _load_oauth_token()
     resolved_base_url = base_url or os.getenv("OPENAI_BASE_URL", "https://portal.qwen.ai/v1")
     resolved_model = model or os.getenv("OPENAI_MODEL", "qwen3-coder-plus")
 
-    client = OpenAI(
-        api_key=access_token,
-        base_url=resolved_base_url,
-    )
+    def create(access_token: str):
+        return _get_client(resolved_base_url, access_token).chat.completions.create(
+            model=resolved_model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+        )
 
-    completion = client.chat.completions.create(
-        model=resolved_model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=temperature,
-    )
+    try:
+        completion = create(_load_oauth_token())
+    except AuthenticationError:
+        # The token was refreshed or revoked since it was cached; reload and retry once
+        completion = create(_load_oauth_token(force_reload=True))
 
     message = completion.choices[0].message.content
     usage = completion.usage.model_dump() if getattr(completion, "usage", None) else None
@@ -7,16 +7,21 @@ def check_subtask_responses() -> dict:
     """
     completed_dir = "scratch/completed_tasks"
     
-    if not os.path.exists(completed_dir):
+    # One directory pass; entry types come from the directory listing itself
+    try:
+        with os.scandir(completed_dir) as entries:
+            task_entries = sorted(
+                (entry for entry in entries
+                 if entry.name.startswith("task_") and entry.name.endswith(".txt") and entry.is_file()),
+                key=lambda entry: entry.name
+            )
+    except FileNotFoundError:
         return {
             "status": "error",
             "message": "No completed tasks found. Complete tasks before synthesizing."
         }
     
-    # Read all completed task files
-    task_files = sorted([f for f in os.listdir(completed_dir) if f.startswith("task_") and f.endswith(".txt")])
-    
-    if not task_files:
+    if not task_entries:
         return {
             "status": "error",
             "message": "No completed tasks found in completed_tasks directory."
@@ -24,11 +29,10 @@ def check_subtask_responses() -> dict:
     
     # Collect all task contents
     responses = {}
-    for task_file in task_files:
-        task_path = os.path.join(completed_dir, task_file)
-        with open(task_path, 'r') as f:
-            content = f.read().strip()
-            task_num = task_file.replace("task_", "").replace(".txt", "")
-            responses[task_num] = content
+    for entry in task_entries:
+        with open(entry.path, 'rb') as f:
+            content = f.read().decode('utf-8').strip()
+        task_num = entry.name[len("task_"):-len(".txt")]
+        responses[task_num] = content
     
     return responses
@@ -6,16 +6,57 @@ Checks all URLs in a response to ensure they are valid, accessible, and actually
 import re
 import os
 import json
+import hashlib
+import threading
 import requests
 import yaml
 import sys
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from urllib.parse import urlparse
 from pathlib import Path
 from openai import OpenAI
 
 # Add parent directory to path to import utils
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
-from utils import load_config, get_scratch_dir
+from utils import TokenBucket, load_config, get_scratch_dir
+
+# Patterns used by _extract_urls_with_context, compiled once at import.
+# Links never run across a sentence boundary (punctuation then whitespace),
+# so each one falls inside exactly one sentence.
+_NO_BOUNDARY = r'(?![.!?]\s)'
+_LINK_RE = re.compile(
+    rf'\[(?:{_NO_BOUNDARY}[^\]])+\]\((?P<md>(?:{_NO_BOUNDARY}[^)])+)\)'  # Markdown links: [text](url)
+    rf'|(?P<bare>https?://(?:{_NO_BOUNDARY}[^\s\)>\]"])+)'  # Bare URLs
+)
+_SENT_RE = re.compile(r'[.!?]\s+')  # Sentence boundaries (simple approach)
+
+# Leading "url" field of a cached page record, as the web skill writes them
+_RECORD_URL_RE = re.compile(rb'\{\s*"url"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+# Cleanup applied to cached page content before it goes into the prompt
+_MD_IMAGE_RE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+_MD_LINK_TARGET_RE = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+_INLINE_SPACE_RE = re.compile(r'[ \t\f\v]+')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+
+# Page content budget per verification (~4 characters per token)
+MAX_CONTENT_TOKENS = 2000
+MAX_CONTENT_CHARS = MAX_CONTENT_TOKENS * 4
+
+# Citations verified concurrently (each check is a blocking LLM call)
+VERIFY_PARALLELISM = int(os.getenv("VERIFY_PARALLELISM", "8"))
+
+# Keeps parallel verification under provider rate limits: bursts of up to 10
+# calls, then 30 per minute
+_LLM_BUCKET = TokenBucket(capacity=10, refill_per_sec=0.5)
+
+# Verdicts keyed by (url, claim, hash of the content shown to the LLM), so
+# re-verifying a draft only pays for citations that changed
+_verify_cache = {}
+_verify_cache_lock = threading.Lock()
+MAX_VERIFY_CACHE = 1000
 
 
 def _extract_urls_with_context(text):
@@ -23,57 +64,164 @@ def _extract_urls_with_context(text):
     Extract all URLs from text along with surrounding context
     Returns: [(url, context_sentence), ...]
     """
-    results = []
+    # Single pass over the text; the sentence around each link is found by
+    # bisecting the boundary positions
+    boundaries = [(m.start(), m.end()) for m in _SENT_RE.finditer(text)]
+    boundary_starts = [start for start, _ in boundaries]
     
-    # Split into sentences (simple approach)
-    sentences = re.split(r'[.!?]\s+', text)
+    results = {}  # url -> claim, first occurrence wins
+    for match in _LINK_RE.finditer(text):
+        idx = bisect_left(boundary_starts, match.start())
+        sentence_start = boundaries[idx - 1][1] if idx else 0
+        sentence_end = boundaries[idx][0] if idx < len(boundaries) else len(text)
+        url = match.group('md') or match.group('bare')
+        results.setdefault(url, text[sentence_start:sentence_end].strip())
     
-    for sentence in sentences:
-        # Extract markdown links: [text](url)
-        markdown_pattern = r'\[([^\]]+)\]\(([^)]+)\)'
-        for match in re.finditer(markdown_pattern, sentence):
-            url = match.group(2)
-            claim = sentence.strip()
-            results.append((url, claim))
-        
-        # Extract bare URLs
-        url_pattern = r'https?://[^\s\)>\]"]+'
-        for match in re.finditer(url_pattern, sentence):
-            url = match.group(0)
-            claim = sentence.strip()
-            results.append((url, claim))
+    return list(results.items())
+
+
+def _record_url(line):
+    """Get a cached record's URL, decoding just that field when it comes first"""
+    match = _RECORD_URL_RE.match(line)
+    if match:
+        return json.loads(match.group(1))
+    return json.loads(line).get('url')
+
+
+def _build_url_index():
+    """
+    Map each cached URL to its record in the scratch/url_*.jsonl files
+    Scans scratch/ once so each citation lookup is a dict hit instead of a rescan;
+    page content is not decoded until a cited URL is looked up
+    Returns: {normalized url: (path, byte_offset)}
+    """
+    scratch_dir = get_scratch_dir()
+    if not scratch_dir.exists():
+        return {}
     
-    # Deduplicate while preserving order
-    seen = set()
-    unique_results = []
-    for url, claim in results:
-        if url not in seen:
-            seen.add(url)
-            unique_results.append((url, claim))
+    index = {}
+    with os.scandir(scratch_dir) as entries:
+        for entry in entries:
+            if not (entry.name.startswith("url_") and entry.name.endswith(".jsonl")):
+                continue
+            try:
+                with open(entry.path, 'rb') as f:
+                    offset = 0
+                    for line in f:
+                        if line.strip():
+                            # Skip malformed records (not an object, or no string url)
+                            try:
+                                url = _record_url(line)
+                            except (ValueError, TypeError, AttributeError):
+                                url = None
+                            if isinstance(url, str):
+                                index.setdefault(_normalize_url(url), (entry.path, offset))
+                        offset += len(line)
+            except OSError:
+                continue
     
-    return unique_results
+    return index
 
 
-def _find_cached_content(url):
+@lru_cache(maxsize=2048)
+def _normalize_url(url):
+    """
+    Key form of a URL: lowercase scheme and host, no fragment, no trailing '/'
+    (so a citation still matches the cached page when those differ)
     """
-    Find cached web content from scratch/ directory
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return url
+    path = parsed.path.rstrip('/')
+    return parsed._replace(
+        scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(), path=path, fragment=''
+    ).geturl()
+
+
+def _find_cached_content(url, url_index):
+    """
+    Find cached web content from scratch/ directory via the URL index
     Returns: (title, content) or (None, None) if not found
     """
-    scratch_dir = get_scratch_dir()
-    if not scratch_dir.exists():
+    location = url_index.get(_normalize_url(url))
+    if location is None:
         return None, None
     
-    # Look for url_*.jsonl files
-    for file in scratch_dir.glob("url_*.jsonl"):
+    path, offset = location
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = json.loads(f.readline())
+        return data.get('title'), data.get('content')
+    except (OSError, ValueError):
+        return None, None
+
+
+# Constant instructions go in the system message so providers can cache the
+# prefix; only the claim, URL and content vary per call
+VERIFY_SYSTEM_PROMPT = """You are evaluating whether a web source supports a claim made in an answer.
+
+You will be given the claim made in the answer, the source URL, and content from the source.
+
+TASK: Does the content from this source actually support the claim made in the answer?
+
+Respond with ONLY a JSON object in this exact format:
+{
+  "supports": true or false,
+  "explanation": "Brief explanation of why the content does or does not support the claim",
+  "confidence": "high" or "medium" or "low"
+}"""
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+@lru_cache(maxsize=1)
+def _get_llm_settings():
+    """
+    Verification endpoint and model from config.yaml, read once
+    Returns: (base_url, model)
+    """
+    openai_config = load_config().get('openai', {})
+    return (
+        openai_config.get('base_url', 'https://openrouter.ai/api/v1'),
+        openai_config.get('model', 'nvidia/nemotron-3-nano-30b-a3b:free')
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_client(api_key, base_url):
+    """Shared OpenAI client per endpoint, so verification calls reuse its connection pool"""
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+
+def _extract_json_object(text):
+    """
+    Find the first JSON object embedded in text (e.g. wrapped in prose or a code fence)
+    Returns: dict, or None if there is none
+    """
+    start = text.find('{')
+    while start != -1:
         try:
-            with open(file, 'r') as f:
-                data = json.loads(f.read())
-                if data.get('url') == url:
-                    return data.get('title'), data.get('content')
-        except:
-            continue
-    
-    return None, None
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(obj, dict):
+                return obj
+        except json.JSONDecodeError:
+            pass
+        start = text.find('{', start + 1)
+    return None
+
+
+def _clean_content(content):
+    """
+    Strip markup that costs tokens without helping verification
+    Cached pages are readability-extracted markdown, so page chrome is already
+    gone; what remains is link targets, images and runs of whitespace
+    """
+    content = _MD_IMAGE_RE.sub('', content)
+    content = _MD_LINK_TARGET_RE.sub(r'\1', content)
+    content = _INLINE_SPACE_RE.sub(' ', content)
+    return _BLANK_LINES_RE.sub('\n\n', content).strip()
 
 
 def _verify_citation_with_llm(url, claim, content):
@@ -90,14 +238,19 @@ def _verify_citation_with_llm(url, claim, content):
             'confidence': 'N/A'
         }
     
-    # Truncate content if too long (keep first 8000 chars)
-    if len(content) > 8000:
-        content = content[:8000] + "\n\n[Content truncated...]"
+    # Truncate content if too long, after cleanup so the budget goes to page text
+    content = _clean_content(content)
+    if len(content) > MAX_CONTENT_CHARS:
+        content = content[:MAX_CONTENT_CHARS] + "\n\n[Content truncated...]"
+    
+    cache_key = (_normalize_url(url), claim, hashlib.blake2b(content.encode(), digest_size=16).hexdigest())
+    with _verify_cache_lock:
+        cached = _verify_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
     
-    config = load_config()
     api_key = os.getenv("OPENROUTER_API_KEY")
-    base_url = config.get('openai', {}).get('base_url', 'https://openrouter.ai/api/v1')
-    model = config.get('openai', {}).get('model', 'nvidia/nemotron-3-nano-30b-a3b:free')
+    base_url, model = _get_llm_settings()
     
     if not api_key:
         return {
@@ -106,43 +259,40 @@ def _verify_citation_with_llm(url, claim, content):
             'confidence': 'N/A'
         }
     
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    client = _get_client(api_key, base_url)
     
-    prompt = f"""You are evaluating whether a web source supports a claim made in an answer.
-
-CLAIM MADE IN ANSWER:
+    _LLM_BUCKET.acquire()
+    
+    prompt = f"""CLAIM MADE IN ANSWER:
 {claim}
 
 SOURCE URL:
 {url}
 
 CONTENT FROM SOURCE:
-{content}
-
-TASK: Does the content from this source actually support the claim made in the answer?
-
-Respond with ONLY a JSON object in this exact format:
-{{
-  "supports": true or false,
-  "explanation": "Brief explanation of why the content does or does not support the claim",
-  "confidence": "high" or "medium" or "low"
-}}"""
+{content}"""
 
     try:
         response = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=[
+                {"role": "system", "content": VERIFY_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
             temperature=0.1
         )
         
         result_text = response.choices[0].message.content.strip()
         
-        # Try to extract JSON from response
-        # Look for JSON block
-        json_match = re.search(r'\{[^}]+\}', result_text, re.DOTALL)
-        if json_match:
-            result = json.loads(json_match.group(0))
-            return result
+        # JSON mode should return a bare object; still tolerate wrapped replies
+        result = _extract_json_object(result_text)
+        if result is not None:
+            with _verify_cache_lock:
+                if len(_verify_cache) >= MAX_VERIFY_CACHE:
+                    _verify_cache.pop(next(iter(_verify_cache)))
+                _verify_cache[cache_key] = result
+            return dict(result)
         else:
             # Fallback if no valid JSON
             return {
@@ -159,6 +309,31 @@ Respond with ONLY a JSON object in this exact format:
         }
 
 
+def _verify_one(url, claim, url_index):
+    """Check one cited URL against its claim using the cached page content"""
+    # Try to find cached content
+    title, content = _find_cached_content(url, url_index)
+    
+    if content:
+        # Verify with LLM
+        verification = _verify_citation_with_llm(url, claim, content)
+        return {
+            'claim': claim,
+            'cached': True,
+            'title': title,
+            **verification
+        }
+    
+    # No cached content - mark as unverifiable
+    return {
+        'claim': claim,
+        'cached': False,
+        'supports': False,
+        'explanation': 'Content not cached - cannot verify',
+        'confidence': 'N/A'
+    }
+
+
 def execute(params):
     """
     Execute the verify_links tool
@@ -186,36 +361,17 @@ def execute(params):
             }
         }
     
-    # Check each URL
-    results = {}
-    unsupported_urls = []
+    # Check the URLs concurrently against one index of the cached pages
+    url_index = _build_url_index()
+    verified = {}
+    with ThreadPoolExecutor(max_workers=VERIFY_PARALLELISM) as executor:
+        futures = {executor.submit(_verify_one, url, claim, url_index): url for url, claim in url_claims}
+        for future in as_completed(futures):
+            verified[futures[future]] = future.result()
     
-    for url, claim in url_claims:
-        # Try to find cached content
-        title, content = _find_cached_content(url)
-        
-        if content:
-            # Verify with LLM
-            verification = _verify_citation_with_llm(url, claim, content)
-            results[url] = {
-                'claim': claim,
-                'cached': True,
-                'title': title,
-                **verification
-            }
-            
-            if not verification['supports']:
-                unsupported_urls.append(url)
-        else:
-            # No cached content - mark as unverifiable
-            results[url] = {
-                'claim': claim,
-                'cached': False,
-                'supports': False,
-                'explanation': 'Content not cached - cannot verify',
-                'confidence': 'N/A'
-            }
-            unsupported_urls.append(url)
+    # Report in citation order
+    results = {url: verified[url] for url, _ in url_claims}
+    unsupported_urls = [url for url, result in results.items() if not result.get('supports')]
     
     # Build report
     total_urls = len(url_claims)
@@ -3,9 +3,21 @@
 Coding skill tools - write and execute Python code
 Uses coding model from config.yaml
 """
+import hashlib
+import mmap
 import os
+import re
+import selectors
+import shutil
+import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from types import SimpleNamespace
+import httpx
+import orjson
 from dotenv import load_dotenv
 from rich.console import Console
 from rich.live import Live
@@ -18,7 +30,57 @@ console = Console()
 
 # Add parent directory to path to import utils
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
-from utils import load_config, get_scratch_dir, detect_new_files, sanitize_filename
+from utils import (
+    load_config, get_scratch_dir, detect_new_files, sanitize_filename,
+    get_conversation_history, remove_last_tool_exchange
+)
+
+
+def _dumps(obj) -> str:
+    """Serialize a tool result with orjson (tool results must be str)"""
+    return orjson.dumps(obj).decode()
+
+
+# Spinner characters
+SPINNER_FRAMES = ("⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏")
+
+# First fenced block (```, ```python or ```py); an unclosed fence runs to the end
+_CODE_FENCE_OPEN = r"```(?:python|py)?[ \t]*\n"
+_CODE_FENCE_RE = re.compile(_CODE_FENCE_OPEN + r"(.*?)(?:```|\Z)", re.DOTALL)
+# The same block once its closing fence has streamed in
+_CLOSED_CODE_FENCE_RE = re.compile(_CODE_FENCE_OPEN + r".*?```", re.DOTALL)
+
+# ripgrep binary used by grep_file when installed
+_RG_PATH = shutil.which('rg')
+
+# LLM-chosen script names, keyed by model + task (scratch/ is wiped each run)
+SCRIPT_NAME_CACHE_DIR = Path("data") / "script_names"
+
+
+@lru_cache(maxsize=1)
+def _get_config():
+    """config.yaml, parsed once per process (treat as read-only)"""
+    return load_config()
+
+
+@lru_cache(maxsize=1)
+def _get_http_client():
+    """
+    One HTTP/2 connection pool shared by every coding-tool OpenAI client, so
+    code generation and script naming multiplex over the same connection
+    """
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+        # Same as the OpenAI SDK default: long reads for slow generations
+        timeout=httpx.Timeout(600.0, connect=5.0)
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_client(base_url, api_key):
+    """Shared OpenAI client per endpoint, so back-to-back calls reuse its connection pool"""
+    return OpenAI(base_url=base_url, api_key=api_key, http_client=_get_http_client())
 
 
 def generate_code(task_description: str, context: str = "") -> str:
@@ -33,12 +95,9 @@ def generate_code(task_description: str, context: str = "") -> str:
     Returns:
         JSON string with execution results
     """
-    import json
-    import time
-    import subprocess
     
     try:
-        config = load_config()
+        config = _get_config()
         
         # Get coding model from config
         coding_model = config.get('coding', {}).get('model', 'qwen/qwen3-coder:free')
@@ -87,19 +146,28 @@ Requirements:
 
 Output only the Python code, no explanations."""
 
+        # Scripts are named from the task description unless coding.llm_filenames
+        # is set; then the base LLM names it in the background so that request
+        # overlaps code generation instead of following it
+        filename_future = None
+        if config.get('coding', {}).get('llm_filenames', False):
+            naming_pool = ThreadPoolExecutor(max_workers=1)
+            filename_future = naming_pool.submit(_generate_script_filename, task_description, config)
+            naming_pool.shutdown(wait=False)
+
         # Retry with exponential backoff for rate limits
         max_retries = 3
         retry_delay = 2
         
         for attempt in range(max_retries):
             try:
-                # Create spinner display
-                spinner_frames = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
+                # Status line only changes between steps, so render on update
+                # instead of running Live's background refresh thread
                 frame_idx = 0
                 
-                with Live(console=console, refresh_per_second=10, transient=False) as live:
+                with Live(console=console, auto_refresh=False, transient=False) as live:
                     # Step 1: Generate code
-                    live.update(Text(f"{spinner_frames[frame_idx % len(spinner_frames)]} Generating code...", style="cyan"))
+                    live.update(Text(f"{SPINNER_FRAMES[frame_idx % len(SPINNER_FRAMES)]} Generating code...", style="cyan"), refresh=True)
                     gen_start = time.time()
                     
                     # Use appropriate API based on detection
@@ -135,56 +203,51 @@ Output only the Python code, no explanations."""
                         usage = None
                     else:
                         # Use OpenAI client for OpenRouter
-                        client = OpenAI(
-                            base_url=base_url,
-                            api_key=api_key
-                        )
-                        response = client.chat.completions.create(
-                            model=coding_model,
-                            messages=[{"role": "user", "content": prompt}],
-                            temperature=0.2
+                        client = _get_client(base_url, api_key)
+
+                        def _on_first_token(elapsed):
+                            live.update(Text(f"{SPINNER_FRAMES[frame_idx % len(SPINNER_FRAMES)]} Generating code... (first token {elapsed:.1f}s)", style="cyan"), refresh=True)
+
+                        code, usage = _stream_code_completion(
+                            client, coding_model, prompt, gen_start, _on_first_token
                         )
-                        code = response.choices[0].message.content
-                        usage = None
-                        if hasattr(response, 'usage') and response.usage:
-                            usage = {
-                                'prompt_tokens': response.usage.prompt_tokens,
-                                'completion_tokens': response.usage.completion_tokens,
-                                'total_tokens': response.usage.total_tokens
-                            }
                     
                     gen_time = time.time() - gen_start
                     
                     # Extract code from markdown if present
-                    if "```python" in code:
-                        code = code.split("```python")[1].split("```")[0].strip()
-                    elif "```" in code:
-                        code = code.split("```")[1].split("```")[0].strip()
+                    fence = _CODE_FENCE_RE.search(code)
+                    if fence:
+                        code = fence.group(1).strip()
                     
-                    # Generate filename using base LLM for a meaningful name
-                    filename = _generate_script_filename(task_description, config)
+                    if filename_future:
+                        filename = filename_future.result()
+                    else:
+                        filename = _fallback_filename(task_description)
                     
                     # Save code to scratch/code/
                     scratch_dir = get_scratch_dir()
                     code_dir = scratch_dir / "code"
-                    code_dir.mkdir(parents=True, exist_ok=True)
-
-                    filename = _ensure_unique_filename(code_dir, filename)
+                    # Only create the directory when listing it fails; a
+                    # remembered "already created" flag would go stale because
+                    # scratch/ is wiped at the start of every run
+                    try:
+                        filename = _ensure_unique_filename(code_dir, filename)
+                    except FileNotFoundError:
+                        code_dir.mkdir(parents=True, exist_ok=True)
                     code_file = code_dir / filename
                     with open(code_file, 'w') as f:
                         f.write(code)
                     
                     # Step 2: Execute code
                     frame_idx += 1
-                    live.update(Text(f"{spinner_frames[frame_idx % len(spinner_frames)]} Executing {filename}...", style="cyan"))
+                    live.update(Text(f"{SPINNER_FRAMES[frame_idx % len(SPINNER_FRAMES)]} Executing {filename}...", style="cyan"), refresh=True)
                     exec_start = time.time()
                     
-                    result = subprocess.run(
+                    max_output_chars = 4000
+                    result = _run_capped(
                         [sys.executable, str(code_file)],
-                        capture_output=True,
-                        text=True,
                         timeout=30,
-                        cwd=Path.cwd()
+                        max_output_chars=max_output_chars
                     )
                     exec_time = time.time() - exec_start
                     
@@ -194,10 +257,12 @@ Output only the Python code, no explanations."""
                         output += "\n[STDERR]\n" + result.stderr
                     
                     # Auto-truncate large output to prevent context overflow
-                    max_output_chars = 4000
+                    # (past the capture cap only the byte count is known)
                     truncated = False
                     original_output_len = len(output)
-                    if len(output) > max_output_chars:
+                    if result.clipped:
+                        original_output_len = result.stdout_len + result.stderr_len
+                    if result.clipped or len(output) > max_output_chars:
                         output = output[:max_output_chars] + "\n\n[OUTPUT TRUNCATED - exceeded 4000 characters]\n\nWARNING: The code generated excessive output. When creating the task description, be more explicit about limiting output (e.g., 'print only a summary', 'show first 10 items', 'save to file instead of printing')."
                         truncated = True
                     
@@ -228,11 +293,11 @@ Output only the Python code, no explanations."""
                     if new_files:
                         summary.append(f" [{len(new_files)} file(s)]", style="green")
                     
-                    live.update(summary)
+                    live.update(summary, refresh=True)
 
                     # Emit extra console detail on failures
                     if result.returncode != 0:
-                        error_text = result.stderr.strip() if result.stderr else result.stdout.strip()
+                        error_text = result.stderr_tail.strip() if result.stderr else result.stdout.strip()
                         if error_text:
                             max_len = 600
                             tail = error_text[-max_len:]
@@ -257,7 +322,7 @@ Output only the Python code, no explanations."""
                 if usage:
                     result_data["result"]["usage"] = usage
                 
-                return json.dumps(result_data)
+                return _dumps(result_data)
                 
             except subprocess.TimeoutExpired:
                 # Show timeout error in final status
@@ -267,7 +332,7 @@ Output only the Python code, no explanations."""
                 error_text.append(f" [gen {gen_time:.1f}s]", style="dim")
                 console.print(error_text)
                 
-                return json.dumps({
+                return _dumps({
                     "error": "Code execution timed out after 30 seconds. The generated code is taking too long to run. Simplify the task or add explicit limits (e.g., 'process only first 100 items').",
                     "code_file": str(code_file) if 'code_file' in locals() else None
                 })
@@ -284,21 +349,172 @@ Output only the Python code, no explanations."""
                     # Not a rate limit or final attempt - raise it
                     raise
         
-        return json.dumps({
+        return _dumps({
             "error": "Max retries exceeded for rate limit"
         })
     
     except Exception as e:
-        return json.dumps({
+        return _dumps({
             "error": f"Failed to generate and execute code: {str(e)}"
         })
 
 
+# Give up on a code completion that runs past this many characters
+MAX_GENERATED_CODE_CHARS = 100_000
+
+
+def _stream_code_completion(client, model: str, prompt: str, start_time: float, on_first_token=None):
+    """
+    Stream a code completion, stopping as soon as the first code block closes
+    (anything after it is discarded by the fence extraction anyway).
+    
+    Returns:
+        (text, usage) - usage is None if the provider didn't report it or the
+        stream was cut short
+    """
+
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parts = []
+    size = 0
+    usage = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                usage = {
+                    'prompt_tokens': chunk.usage.prompt_tokens,
+                    'completion_tokens': chunk.usage.completion_tokens,
+                    'total_tokens': chunk.usage.total_tokens
+                }
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if not parts and on_first_token:
+                on_first_token(time.time() - start_time)
+            parts.append(delta)
+            size += len(delta)
+            if size > MAX_GENERATED_CODE_CHARS:
+                raise RuntimeError(
+                    f"Generated code exceeded {MAX_GENERATED_CODE_CHARS:,} characters; narrow the task description."
+                )
+            if '`' in delta and _CLOSED_CODE_FENCE_RE.search("".join(parts)):
+                break
+    finally:
+        stream.close()
+    return "".join(parts), usage
+
+
+# Bytes of each stream's tail kept once its head is full, for error reporting
+_OUTPUT_TAIL_BYTES = 2048
+
+
+class _CappedOutput:
+    """Keeps the head and tail of a stream, counting (but dropping) the middle."""
+
+    def __init__(self, head_limit: int):
+        self.head_limit = head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def feed(self, chunk: bytes):
+        self.total += len(chunk)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self.tail += chunk
+            del self.tail[:-_OUTPUT_TAIL_BYTES]
+
+    def text(self) -> str:
+        return self.head.decode('utf-8', 'ignore')
+
+    def tail_text(self) -> str:
+        return (self.head + self.tail).decode('utf-8', 'ignore')
+
+
+def _run_capped(cmd, timeout: float, max_output_chars: int, cwd=None):
+    """
+    Run a command, keeping only a bounded prefix of stdout/stderr in memory.
+    
+    Output past the cap is read and discarded (so the child never blocks on a
+    full pipe) but still counted, so callers can report the original length.
+    Raises subprocess.TimeoutExpired after killing the child, like subprocess.run.
+    Leave cwd as None where possible: setting it rules out the posix_spawn path.
+    """
+
+    # UTF-8 needs at most 4 bytes per character
+    head_limit = max_output_chars * 4
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=65536,
+        cwd=cwd,
+        # With inherited fds and no cwd/preexec_fn, CPython can launch via
+        # posix_spawn instead of fork+exec (Python's own fds are
+        # non-inheritable by default, so nothing extra leaks to the child)
+        close_fds=False
+    )
+    buffers = {
+        proc.stdout.fileno(): _CappedOutput(head_limit),
+        proc.stderr.fileno(): _CappedOutput(head_limit),
+    }
+    deadline = time.monotonic() + timeout
+
+    with selectors.DefaultSelector() as selector:
+        for pipe in (proc.stdout, proc.stderr):
+            os.set_blocking(pipe.fileno(), False)
+            selector.register(pipe, selectors.EVENT_READ)
+
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                proc.kill()
+                proc.wait()
+                proc.stdout.close()
+                proc.stderr.close()
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            for key, _ in selector.select(remaining):
+                try:
+                    chunk = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                if chunk:
+                    buffers[key.fd].feed(chunk)
+                else:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+
+    try:
+        returncode = proc.wait(timeout=max(deadline - time.monotonic(), 0))
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise subprocess.TimeoutExpired(cmd, timeout)
+
+    out, err = buffers.values()
+    return SimpleNamespace(
+        returncode=returncode,
+        stdout=out.text(),
+        stderr=err.text(),
+        stderr_tail=err.tail_text(),
+        stdout_len=out.total,
+        stderr_len=err.total,
+        clipped=out.total > len(out.head) or err.total > len(err.head)
+    )
+
+
 def _generate_script_filename(task_description: str, config: dict) -> str:
     """Use the base LLM to generate a meaningful Python filename."""
-    import os
-    from openai import OpenAI
-
     openai_config = config.get('openai', {})
     base_url = openai_config.get('base_url', 'https://openrouter.ai/api/v1')
     model = openai_config.get('model')
@@ -308,6 +524,15 @@ def _generate_script_filename(task_description: str, config: dict) -> str:
     if not model or not api_key:
         return _fallback_filename(task_description)
 
+    key = hashlib.blake2b(f"{model}\n{task_description}".encode(), digest_size=16).hexdigest()
+    cache_file = SCRIPT_NAME_CACHE_DIR / f"{key}.txt"
+    try:
+        cached = cache_file.read_text().strip()
+        if cached:
+            return cached
+    except OSError:
+        pass
+
     prompt = (
         "Create a short, meaningful Python filename for this task. "
         "Return only the filename without extension. "
@@ -316,7 +541,7 @@ def _generate_script_filename(task_description: str, config: dict) -> str:
     )
 
     try:
-        client = OpenAI(base_url=base_url, api_key=api_key)
+        client = _get_client(base_url, api_key)
         response = client.chat.completions.create(
             model=model,
             messages=[{"role": "user", "content": prompt}],
@@ -333,11 +558,24 @@ def _generate_script_filename(task_description: str, config: dict) -> str:
         sanitized = sanitize_filename(raw_name, max_length=60).strip("_")
         if not sanitized:
             return _fallback_filename(task_description)
-        return f"{sanitized}.py"
+        filename = f"{sanitized}.py"
+        _cache_script_name(cache_file, filename)
+        return filename
     except Exception:
         return _fallback_filename(task_description)
 
 
+def _cache_script_name(cache_file: Path, filename: str):
+    """Write a generated script name to the cache atomically; failures are ignored."""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        partial_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        partial_file.write_text(filename)
+        os.replace(partial_file, cache_file)
+    except OSError:
+        pass
+
+
 def _fallback_filename(task_description: str) -> str:
     """Fallback filename if LLM naming fails."""
     base = sanitize_filename(task_description, max_length=40).strip("_")
@@ -348,18 +586,108 @@ def _fallback_filename(task_description: str) -> str:
 
 def _ensure_unique_filename(code_dir: Path, filename: str) -> str:
     """Ensure filename is unique within the code directory."""
-    import time
-    if not (code_dir / filename).exists():
+    # One directory listing instead of an exists() call per candidate
+    with os.scandir(code_dir) as entries:
+        existing = {entry.name for entry in entries}
+    if filename not in existing:
         return filename
 
     stem = filename[:-3] if filename.endswith(".py") else filename
     for i in range(1, 1000):
         candidate = f"{stem}_{i}.py"
-        if not (code_dir / candidate).exists():
+        if candidate not in existing:
             return candidate
 
     return f"{stem}_{int(time.time())}.py"
 
+@lru_cache(maxsize=8)
+def _resolved_scratch_dir(cwd: str) -> Path:
+    """
+    scratch/ resolved against a working directory. Keyed by cwd rather than
+    computed once at import, since eval workers chdir after startup.
+    """
+    return (Path(cwd) / get_scratch_dir()).resolve()
+
+
+@lru_cache(maxsize=256)
+def _compile_grep_pattern(pattern: str, case_sensitive: bool):
+    """Bytes regex for grep_file, compiled once per pattern (raises re.error)"""
+    flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+    return re.compile(pattern.encode('utf-8'), flags)
+
+
+def _ripgrep_lines(file_path: Path, pattern: str, case_sensitive: bool, max_results: int):
+    """
+    Search with ripgrep, returning (line_number, content) pairs.
+    Returns None if rg fails (e.g. lookarounds/backreferences it doesn't support)
+    so the caller can fall back to Python's re.
+    """
+
+    cmd = [_RG_PATH, '--no-config', '--no-heading', '--no-filename', '--line-number',
+           '--color=never', '--max-count', str(max_results)]
+    if not case_sensitive:
+        cmd.append('-i')
+    cmd += ['--', pattern, str(file_path)]
+
+    try:
+        proc = subprocess.run(cmd, capture_output=True, encoding='utf-8', errors='ignore',
+                              timeout=5, close_fds=False)
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    # Exit code 1 means no matches; anything else is an error
+    if proc.returncode == 1:
+        return []
+    if proc.returncode != 0:
+        return None
+
+    lines = []
+    for raw in proc.stdout.splitlines():
+        line_num, sep, content = raw.partition(':')
+        if not sep or not line_num.isdigit():
+            return None
+        lines.append((int(line_num), content.rstrip('\r')))
+    return lines
+
+
+def _mmap_lines(file_path: Path, regex):
+    """Yield (line_number, content) for each line matching a bytes regex."""
+    # mmap cannot map an empty file
+    if not file_path.stat().st_size:
+        return
+
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        line_num = 1
+        counted_to = 0
+        pos = 0
+        while True:
+            match = regex.search(mm, pos)
+            if not match:
+                return
+            line_start = mm.rfind(b'\n', 0, match.start()) + 1
+            if line_start == len(mm):
+                return  # empty match after the final newline is not a line
+            line_end = mm.find(b'\n', match.start())
+            if line_end == -1:
+                line_end = len(mm)
+
+            # Patterns like \s or [^x] can run past the newline; a match must
+            # fit in its own line (plus that newline, as a per-line search
+            # sees it), so re-check just this line before accepting it
+            if match.end() > line_end + 1 and not regex.search(mm, line_start, line_end + 1):
+                pos = line_end + 1
+                continue
+
+            # Count newlines only between successive matched lines
+            line_num += mm[counted_to:line_start].count(b'\n')
+            counted_to = line_start
+
+            yield line_num, mm[line_start:line_end].decode('utf-8', 'ignore').rstrip('\r')
+
+            # One result per line: resume scanning at the next line
+            pos = line_end + 1
+
+
 def grep_file(filepath: str, pattern: str, case_sensitive: bool = True, max_results: int = 100) -> str:
     """
     Search for a pattern in a file from the scratch directory.
@@ -374,10 +702,6 @@ def grep_file(filepath: str, pattern: str, case_sensitive: bool = True, max_resu
     Returns:
         JSON string with matching lines and line numbers
     """
-    import json
-    import re
-    from utils import get_conversation_history, remove_last_tool_exchange
-    
     # Check if the last tool call was also grep_file - if so, remove it to prevent bloat
     history = get_conversation_history()
     if history:
@@ -395,8 +719,8 @@ def grep_file(filepath: str, pattern: str, case_sensitive: bool = True, max_resu
                 break
     
     try:
-        scratch_dir = get_scratch_dir()
-        project_root = Path.cwd()
+        cwd = os.getcwd()
+        project_root = Path(cwd)
         
         # Convert to Path object and resolve relative to project root
         file_path = Path(filepath)
@@ -405,23 +729,22 @@ def grep_file(filepath: str, pattern: str, case_sensitive: bool = True, max_resu
         
         # Security check: ensure file is within scratch directory
         try:
-            rel_to_scratch = file_path.resolve().relative_to(scratch_dir.resolve())
+            rel_to_scratch = file_path.resolve().relative_to(_resolved_scratch_dir(cwd))
         except ValueError:
-            return json.dumps({
+            return _dumps({
                 "error": f"Access denied: file must be within scratch/ directory"
             })
         
         if not file_path.exists():
-            return json.dumps({
+            return _dumps({
                 "error": f"File not found: {filepath}"
             })
         
-        # Compile regex pattern
-        flags = 0 if case_sensitive else re.IGNORECASE
+        # Compile regex pattern against bytes so it can scan the mapped file
         try:
-            regex = re.compile(pattern, flags)
+            regex = _compile_grep_pattern(pattern, case_sensitive)
         except re.error as e:
-            return json.dumps({
+            return _dumps({
                 "error": f"Invalid regex pattern: {str(e)}"
             })
         
@@ -430,23 +753,26 @@ def grep_file(filepath: str, pattern: str, case_sensitive: bool = True, max_resu
         total_chars = 0
         max_total_chars = 4000  # Limit total output size
         
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            for line_num, line in enumerate(f, 1):
-                if regex.search(line):
-                    line_content = line.rstrip('\n\r')
-                    
-                    # Check if adding this line would exceed our limit
-                    if total_chars + len(line_content) > max_total_chars:
-                        break
-                    
-                    matches.append({
-                        "line_number": line_num,
-                        "content": line_content
-                    })
-                    total_chars += len(line_content)
-                    
-                    if len(matches) >= max_results:
-                        break
+        # Prefer ripgrep; fall back to Python for patterns it can't handle
+        lines = None
+        if _RG_PATH:
+            lines = _ripgrep_lines(file_path, pattern, case_sensitive, max_results)
+        if lines is None:
+            lines = _mmap_lines(file_path, regex)
+        
+        for line_num, line_content in lines:
+            # Check if adding this line would exceed our limit
+            if total_chars + len(line_content) > max_total_chars:
+                break
+            
+            matches.append({
+                "line_number": line_num,
+                "content": line_content
+            })
+            total_chars += len(line_content)
+            
+            if len(matches) >= max_results:
+                break
         
         # Check if we hit limits
         hit_char_limit = total_chars >= max_total_chars
@@ -469,9 +795,9 @@ def grep_file(filepath: str, pattern: str, case_sensitive: bool = True, max_resu
         elif hit_count_limit:
             result["result"]["warning"] = f"Limited to {max_results} matches. Use a more specific pattern to reduce results."
         
-        return json.dumps(result)
+        return _dumps(result)
     
     except Exception as e:
-        return json.dumps({
+        return _dumps({
             "error": f"Failed to search file: {str(e)}"
         })
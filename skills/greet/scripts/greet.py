@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
 """Simple greet script for testing"""
+import time
 from datetime import datetime
 
+# (whole second, formatted time) from the last call; the format has
+# second resolution, so calls within the same second reuse the string
+_last_time = (None, "")
+
+
+def _current_time():
+    global _last_time
+    now = int(time.time())
+    if _last_time[0] != now:
+        _last_time = (now, datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"))
+    return _last_time[1]
+
 
 def execute(params):
     """Execute the greet skill"""
     name = params.get("name", "friend")
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    current_time = _current_time()
     
     greeting = f"Hello, {name}! Welcome to the Agent Skills Framework. The current time is {current_time}."
     
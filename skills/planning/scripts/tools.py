@@ -2,6 +2,14 @@ import os
 import json
 from typing import List, Union
 
+import orjson
+
+
+def _dumps(obj) -> str:
+    """Serialize a tool result with orjson (tool results must be str)"""
+    return orjson.dumps(obj).decode()
+
+
 def create_subquestion_tasks(descriptions: Union[str, List[str]]) -> str:
     """
     Save one or more subquestion/task descriptions to the queue.
@@ -13,7 +21,6 @@ def create_subquestion_tasks(descriptions: Union[str, List[str]]) -> str:
         JSON string with status and details of created tasks
     """
     tasks_dir = "scratch/incomplete_tasks"
-    os.makedirs(tasks_dir, exist_ok=True)
     
     # Normalize input to list
     if isinstance(descriptions, str):
@@ -30,29 +37,49 @@ def create_subquestion_tasks(descriptions: Union[str, List[str]]) -> str:
         # Handle dict input (legacy compatibility)
         descriptions = [descriptions.get('description', str(descriptions))]
     
+    # Coerce every entry to its description string once, up front
+    descriptions = [
+        d if isinstance(d, str)
+        else d.get('description', str(d)) if isinstance(d, dict)
+        else str(d)
+        for d in descriptions
+    ]
+    
     if not descriptions:
-        return json.dumps({
+        return _dumps({
             "status": "error",
             "message": "No task descriptions provided"
         })
     
     created_tasks = []
     
+    # List the queue once; numbering then checks this set instead of
+    # stat'ing each candidate file for every new task. The directory is only
+    # created when missing (scratch/ is wiped each run, so no cached flag)
+    try:
+        with os.scandir(tasks_dir) as entries:
+            existing = {entry.name for entry in entries}
+    except FileNotFoundError:
+        os.makedirs(tasks_dir, exist_ok=True)
+        existing = set()
+    task_num = 0
+    
     for description in descriptions:
-        # Find next task number
-        task_num = 1
-        while os.path.exists(os.path.join(tasks_dir, f"task_{task_num}.txt")):
+        # Find next free task number
+        task_num += 1
+        while f"task_{task_num}.txt" in existing:
             task_num += 1
+        existing.add(f"task_{task_num}.txt")
         
         # Save task
         task_file = os.path.join(tasks_dir, f"task_{task_num}.txt")
         with open(task_file, 'w') as f:
-            f.write(str(description))
+            f.write(description)
         
         created_tasks.append({
             "task_number": task_num,
             "task_file": task_file,
-            "description": str(description)
+            "description": description
         })
     
     # If this was the first batch, initialize CURRENT_TASK.txt with the first task
@@ -63,10 +90,13 @@ def create_subquestion_tasks(descriptions: Union[str, List[str]]) -> str:
             "description": created_tasks[0]["description"],
             "status": "active"
         }
-        with open(current_task_file, 'w') as f:
-            f.write(json.dumps(current_task_data, indent=2))
+        # Write beside it and swap in, so the agent never reads a partial file
+        partial_file = f"{current_task_file}.{os.getpid()}.tmp"
+        with open(partial_file, 'wb') as f:
+            f.write(orjson.dumps(current_task_data, option=orjson.OPT_INDENT_2))
+        os.replace(partial_file, current_task_file)
     
-    return json.dumps({
+    return _dumps({
         "status": "success",
         "tasks_created": len(created_tasks),
         "tasks": created_tasks,
@@ -5,26 +5,78 @@ Web skill tools - consolidated search and URL reading functionality
 import json
 import os
 import re
+import threading
 import time
 import yaml
 import requests
 import html2text
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from pysearx import search as pysearx_search
 from readability import Document
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, urljoin
 import ipaddress
+import socket
 import sys
 
 # Add parent directory to path to import utils
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
 from utils import sanitize_filename, ensure_scratch_dir
 
+# Per-thread sessions (requests.Session is not guaranteed thread-safe and app.py
+# runs agents on several threads) so repeat fetches from the same host reuse a
+# pooled keep-alive connection instead of a new TCP/TLS handshake
+_tls = threading.local()
+
+
+def _session():
+    """Return this thread's pooled requests session, creating it on first use"""
+    session = getattr(_tls, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers['User-Agent'] = 'Mozilla/5.0 (compatible; SkillAgent/1.0)'
+        # One quick retry on gateway errors; the final response is still
+        # returned so raise_for_status() reports it as before
+        retry = Retry(total=1, backoff_factor=0.2, status_forcelist=(502, 503, 504), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _tls.session = session
+    return session
+
 
 # ============================================================================
 # UTILITY FUNCTIONS
 # ============================================================================
 
+# Largest page body read_url will download; bigger pages would only push
+# readability/html2text into their slow paths on huge documents
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+
+# Redirect hops read_url follows, each re-checked against the SSRF guard
+MAX_REDIRECTS = 5
+
+
+def _read_capped(response, max_bytes):
+    """
+    Read a streamed response body, giving up once it passes max_bytes.
+    Returns the body bytes, or None if it was too large.
+    """
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        return None
+    
+    chunks = []
+    total = 0
+    for chunk in response.iter_content(chunk_size=65536):
+        total += len(chunk)
+        if total > max_bytes:
+            return None
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
 def _truncate_json_strings(data, max_string_length=1000):
     """
     Recursively truncate long strings in JSON data structure.
@@ -143,6 +195,67 @@ def _get_user_query_from_context():
     return None
 
 
+def _is_internal_address(ip):
+    """True for addresses read_url must not reach (private, loopback, link-local, ...)"""
+    return (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+            or ip.is_multicast or ip.is_unspecified)
+
+
+def _resolve_host(hostname):
+    """
+    IP addresses for a URL host: the literal itself, or every address DNS
+    returns for a name (so a public-looking name pointing inside is caught).
+    Returns [] if the name doesn't resolve; the fetch will fail on its own.
+    """
+    try:
+        return [ipaddress.ip_address(hostname)]
+    except ValueError:
+        pass
+    try:
+        infos = socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        return []
+    # Drop any IPv6 zone suffix ("fe80::1%eth0") before parsing
+    return [ipaddress.ip_address(info[4][0].split('%', 1)[0]) for info in infos]
+
+
+def _fetch_target_error(url):
+    """Why url must not be fetched (bad scheme, localhost, internal address), or None"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ['http', 'https']:
+        return "Invalid URL scheme. Only HTTP and HTTPS are supported."
+    hostname = parsed.hostname
+    if hostname:
+        if hostname.lower() in ['localhost']:
+            return "Access to localhost is not allowed."
+        if any(_is_internal_address(ip) for ip in _resolve_host(hostname)):
+            return "Access to private IP addresses is not allowed."
+    return None
+
+
+def _get_checked(url, headers=None, **kwargs):
+    """
+    GET url following redirects by hand, so every hop passes the same
+    _fetch_target_error check as the original URL. Best-effort only: the
+    host is resolved again when connecting, so DNS rebinding isn't covered.
+    """
+    headers = dict(headers or {})
+    for _ in range(MAX_REDIRECTS + 1):
+        response = _session().get(url, headers=headers, allow_redirects=False, **kwargs)
+        if not response.is_redirect:
+            return response
+        location = urljoin(url, response.headers['Location'])
+        response.close()
+        error = _fetch_target_error(location)
+        if error:
+            raise ValueError(f"Redirect to {location} refused: {error}")
+        # Like requests, don't forward credentials to a different host
+        if urlparse(location).hostname != urlparse(url).hostname:
+            headers.pop('Authorization', None)
+        url = location
+    raise requests.TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects")
+
+
 def _is_youtube_url(url):
     """Check if URL is a YouTube video"""
     parsed = urlparse(url)
@@ -230,7 +343,7 @@ def _get_pdf_content(url):
         import pypdfium2 as pdfium
         from io import BytesIO
         
-        response = requests.get(url, timeout=30)
+        response = _get_checked(url, timeout=30)
         response.raise_for_status()
         
         # Load PDF from bytes
@@ -312,21 +425,11 @@ def read_url(url: str) -> str:
         return json.dumps({"error": "URL parameter is required"})
     
     # Validate URL scheme (prevent SSRF attacks)
+    # Block private IP ranges to prevent SSRF (redirects are checked hop by hop)
     try:
-        parsed = urlparse(url)
-        if parsed.scheme not in ['http', 'https']:
-            return json.dumps({"error": f"Invalid URL scheme. Only HTTP and HTTPS are supported."})
-        
-        # Block private IP ranges to prevent SSRF
-        hostname = parsed.hostname
-        if hostname:
-            try:
-                ip = ipaddress.ip_address(hostname)
-                if ip.is_private or ip.is_loopback or ip.is_link_local:
-                    return json.dumps({"error": "Access to private IP addresses is not allowed."})
-            except ValueError:
-                if hostname.lower() in ['localhost']:
-                    return json.dumps({"error": "Access to localhost is not allowed."})
+        error = _fetch_target_error(url)
+        if error:
+            return json.dumps({"error": error})
     except Exception as e:
         return json.dumps({"error": f"Invalid URL format: {str(e)}"})
     
@@ -347,7 +450,7 @@ def read_url(url: str) -> str:
     
     # Handle regular web pages
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (compatible; SkillAgent/1.0)'}
+        headers = {}
         
         # Add GitHub token if URL is from GitHub and token is available
         if _is_github_url(url):
@@ -355,8 +458,13 @@ def read_url(url: str) -> str:
             if github_token:
                 headers['Authorization'] = f'token {github_token}'
         
-        response = requests.get(url, timeout=30, headers=headers)
-        response.raise_for_status()
+        with _get_checked(url, headers=headers, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            body = _read_capped(response, MAX_PAGE_BYTES)
+        if body is None:
+            return json.dumps({
+                "error": f"Response from {url} exceeds {MAX_PAGE_BYTES // (1024 * 1024)} MB; not fetched. Try a more specific page or an API endpoint."
+            })
         
         # Check if response is JSON
         content_type = response.headers.get('Content-Type', '')
@@ -365,7 +473,7 @@ def read_url(url: str) -> str:
         if is_json:
             # Handle JSON response
             try:
-                json_data = response.json()
+                json_data = json.loads(body)
                 json_str = json.dumps(json_data, indent=2)
                 
                 # Always save raw JSON to scratch
@@ -424,15 +532,25 @@ def read_url(url: str) -> str:
         
         # Handle HTML/text content
         # Use readability to extract main content
-        doc = Document(response.text)
+        try:
+            page_text = body.decode(response.encoding or 'utf-8', errors='replace')
+        except LookupError:
+            # Unknown charset in the headers
+            page_text = body.decode('utf-8', errors='replace')
+        doc = Document(page_text)
+        # Before summary(): the tree it leaves on doc.html has no <head>
         title = doc.title()
         html_content = doc.summary()
+        # Release the raw page and readability's tree before converting, so
+        # only the extracted article is alive alongside the markdown
+        del body, page_text, doc
         
         # Convert HTML to markdown
         h = html2text.HTML2Text()
         h.ignore_links = False
         h.ignore_images = True
         markdown_content = h.handle(html_content)
+        del html_content
         
         # Save full content to scratch
         _save_to_scratch(url, title, markdown_content)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for the coding skill's local helpers (no API keys or network needed)
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from skills.coding.scripts import tools
+
+
+def _grep_in_scratch(contents, pattern, **kwargs):
+    """Run grep_file (Python scanner, not ripgrep) on a scratch file holding contents"""
+    previous_cwd = os.getcwd()
+    previous_rg = tools._RG_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        tools._RG_PATH = None
+        try:
+            Path("scratch").mkdir()
+            Path("scratch/sample.txt").write_text(contents)
+            return json.loads(tools.grep_file("scratch/sample.txt", pattern, **kwargs))
+        finally:
+            tools._RG_PATH = previous_rg
+            os.chdir(previous_cwd)
+
+
+def test_grep_file_matches_lines():
+    """Each matching line is reported once with its line number"""
+    print("Testing grep_file line matching...")
+    result = _grep_in_scratch("alpha\nbeta foo\n\ngamma foo foo\nfoo", "foo")["result"]
+    assert [(m["line_number"], m["content"]) for m in result["matches"]] == [
+        (2, "beta foo"), (4, "gamma foo foo"), (5, "foo")
+    ], result
+    print("✓ grep_file reports each matching line once")
+
+
+def test_grep_file_does_not_match_across_lines():
+    """Patterns that can consume newlines still only match within one line"""
+    print("\nTesting grep_file with patterns spanning lines...")
+    contents = "alpha bravo\ncharlie\nnothing here\nno match\n"
+    for pattern in (r"alpha[^z]*charlie", r"here\s+no", r"bravo\Wcharlie"):
+        result = _grep_in_scratch(contents, pattern)["result"]
+        assert result["matches"] == [], (pattern, result)
+
+    # A later line that does match on its own is still found
+    result = _grep_in_scratch("alpha\nbravo\nalpha charlie\n", r"alpha[^z]*charlie")["result"]
+    assert [(m["line_number"], m["content"]) for m in result["matches"]] == [
+        (3, "alpha charlie")
+    ], result
+    print("✓ grep_file matches never span a newline")
+
+
+def _python(code):
+    """Command running a Python snippet with this interpreter"""
+    return [sys.executable, "-c", code]
+
+
+def test_run_capped_normal_output():
+    """Small outputs come back whole, with the exit code"""
+    print("\nTesting _run_capped with small output...")
+    result = tools._run_capped(
+        _python("import sys; print('hello'); sys.stderr.write('warn'); sys.exit(3)"),
+        timeout=30, max_output_chars=1000
+    )
+    assert result.returncode == 3, result
+    assert result.stdout == "hello\n", result
+    assert result.stderr == "warn", result
+    assert result.stdout_len == len("hello\n") and result.stderr_len == len("warn"), result
+    assert not result.clipped, result
+    print("✓ _run_capped returns complete output and exit code")
+
+
+def test_run_capped_clips_long_output():
+    """Output past the cap is dropped but still counted"""
+    print("\nTesting _run_capped with output over the cap...")
+    total = 200000
+    result = tools._run_capped(
+        _python(f"import sys; sys.stdout.write('x' * {total})"),
+        timeout=30, max_output_chars=100
+    )
+    assert result.returncode == 0, result
+    assert result.clipped, result
+    assert result.stdout_len == total, result.stdout_len
+    assert result.stdout == "x" * 400, len(result.stdout)
+    print("✓ _run_capped keeps a bounded prefix and the full length")
+
+
+def test_run_capped_keeps_stderr_tail():
+    """The end of a long stderr (where tracebacks land) is kept"""
+    print("\nTesting _run_capped stderr tail...")
+    result = tools._run_capped(
+        _python("import sys; sys.stderr.write('-' * 100000 + 'ValueError: boom')"),
+        timeout=30, max_output_chars=100
+    )
+    assert result.clipped, result
+    assert result.stderr_len == 100000 + len("ValueError: boom"), result.stderr_len
+    assert "boom" not in result.stderr, result.stderr
+    assert result.stderr_tail.endswith("ValueError: boom"), result.stderr_tail[-50:]
+    print("✓ _run_capped keeps the tail of stderr")
+
+
+def test_run_capped_timeout():
+    """A child outliving the timeout is killed and TimeoutExpired raised"""
+    print("\nTesting _run_capped timeout...")
+    start = time.monotonic()
+    try:
+        tools._run_capped(_python("import time; time.sleep(30)"), timeout=0.5, max_output_chars=100)
+    except subprocess.TimeoutExpired as e:
+        assert e.timeout == 0.5, e
+    else:
+        raise AssertionError("expected subprocess.TimeoutExpired")
+    assert time.monotonic() - start < 10, "child was not killed promptly"
+    print("✓ _run_capped kills the child and raises TimeoutExpired")
+
+
+if __name__ == "__main__":
+    test_grep_file_matches_lines()
+    test_grep_file_does_not_match_across_lines()
+    test_run_capped_normal_output()
+    test_run_capped_clips_long_output()
+    test_run_capped_keeps_stderr_tail()
+    test_run_capped_timeout()
+    print("\nAll coding tool tests passed!")
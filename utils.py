@@ -1,6 +1,8 @@
 """Utility functions for the agent framework."""
+import os
 import re
-import yaml
+import threading
+import time
 from pathlib import Path
 from typing import Dict, Any, Optional
 
@@ -19,6 +21,9 @@ def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
     if not config_file.exists():
         return {}
     
+    # Imported here so importing utils (e.g. for `eval.py --help`) doesn't pay for yaml
+    import yaml
+    
     try:
         with open(config_file, 'r') as f:
             config = yaml.safe_load(f)
@@ -46,6 +51,36 @@ def sanitize_filename(name: str, max_length: int = 100) -> str:
     return name[:max_length]
 
 
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    
+    Holds up to `capacity` tokens (the allowed burst), refilled continuously
+    at `refill_per_sec`.
+    """
+    
+    def __init__(self, capacity: float, refill_per_sec: float):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: float = 1) -> None:
+        """Block until `tokens` tokens are available, then take them."""
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_sec)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.refill_per_sec
+            time.sleep(wait)
+
+
 def get_scratch_dir() -> Path:
     """Get the scratch directory path."""
     return Path("scratch")
@@ -69,23 +104,40 @@ def detect_new_files(
     """Detect files in scratch/ modified at or after a given timestamp."""
     new_files = []
     base_dir = scratch_dir or get_scratch_dir()
-    if base_dir.exists():
-        for file_path in base_dir.rglob('*'):
-            if not file_path.is_file():
-                continue
-            if skip_internal and file_path.name in ['USER_QUERY.txt', 'CURRENT_TASK.txt']:
+    if not base_dir.exists():
+        return new_files
+
+    # Walk with os.scandir so each entry costs one (cached) stat. Subtrees are
+    # not pruned by directory mtime: rewriting an existing file doesn't touch it.
+    stack = [(str(base_dir), ())]
+    while stack:
+        dir_path, rel_parts = stack.pop()
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError:
+            continue
+        for entry in entries:
+            parts = rel_parts + (entry.name,)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, parts))
+                    continue
+                if not entry.is_file():
+                    continue
+                if skip_internal and entry.name in ['USER_QUERY.txt', 'CURRENT_TASK.txt']:
+                    continue
+                if skip_tasks and ('incomplete_tasks' in rel_parts or 'completed_tasks' in rel_parts):
+                    continue
+                if skip_code_py and entry.name.endswith('.py') and 'code' in rel_parts:
+                    continue
+
+                stat = entry.stat()
+            except OSError:
                 continue
-            if skip_tasks and ('incomplete_tasks' in file_path.parts or 'completed_tasks' in file_path.parts):
-                continue
-            if skip_code_py and file_path.suffix == '.py' and 'code' in file_path.parts:
-                continue
-
-            file_mtime = file_path.stat().st_mtime
-            if file_mtime >= since_timestamp:
-                rel_path = file_path.relative_to(base_dir)
+            if stat.st_mtime >= since_timestamp:
                 new_files.append({
-                    'path': str(rel_path),
-                    'size': file_path.stat().st_size
+                    'path': os.path.join(*parts),
+                    'size': stat.st_size
                 })
     return new_files
 